@@ -0,0 +1,272 @@
+# SeitenBot2 apicassette.py
+
+# MIT License
+#
+# Copyright (c) 2025 Honjitsu-Seiten (https://github.com/Honjitsu-Seiten)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import base64
+import collections
+import importlib
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import pywikibot
+from pywikibot.comms import http
+
+# 照合に使わないパラメーター（トークンやパスワードは実行ごとに変わる）
+volatile_params = {"token", "lgtoken", "lgpassword", "curtimestamp", "maxlag"}
+
+# 記録する応答ヘッダー
+recorded_headers = ("content-type", "retry-after", "mediawiki-api-error")
+
+
+def request_key(method, url, body=None):
+    """リクエストを照合するためのキーを返す"""
+    parts = urlsplit(url)
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    if isinstance(body, dict):
+        params.extend(body.items())
+    elif body:
+        if isinstance(body, bytes):
+            body = body.decode("utf-8", errors="replace")
+        params.extend(parse_qsl(body, keep_blank_values=True))
+    params = sorted(
+        (str(k), str(v)) for k, v in params if str(k) not in volatile_params
+    )
+    return json.dumps(
+        [method.upper(), parts.netloc, parts.path, params], ensure_ascii=False
+    )
+
+
+class Stats:
+    """リクエスト数と転送量を集計する"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes = 0
+        self.missed = 0
+
+    def add(self, size, missed=False):
+        with self.lock:
+            self.requests += 1
+            self.bytes += size
+            self.missed += missed
+
+    def report(self, elapsed):
+        pywikibot.output(
+            "リクエスト数: {0.requests} (未記録: {0.missed}) / "
+            "転送量: {0.bytes} bytes / 実行時間: {1:.3f} 秒".format(self, elapsed)
+        )
+
+
+class Recorder:
+    """pywikibotのHTTPセッションを通る通信をカセットに記録する"""
+
+    def __init__(self, filename):
+        self.file = open(filename, "w", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.stats = Stats()
+        self.request = http.session.request
+
+    def install(self):
+        http.session.request = self._request
+
+    def uninstall(self):
+        http.session.request = self.request
+        self.file.close()
+
+    def _request(self, method, url, **kwargs):
+        response = self.request(method, url, **kwargs)
+        entry = {
+            "key": request_key(method, url, kwargs.get("data") or kwargs.get("params")),
+            "status": response.status_code,
+            "headers": {
+                k: response.headers[k]
+                for k in recorded_headers
+                if k in response.headers
+            },
+        }
+        try:
+            entry["body"] = response.content.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["body_base64"] = base64.b64encode(response.content).decode("ascii")
+        self.stats.add(len(response.content))
+        with self.lock:
+            self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return response
+
+
+class Cassette:
+    """記録した応答を、リクエストのキーごとに記録順に返す"""
+
+    def __init__(self, filename):
+        self.lock = threading.Lock()
+        self.entries = collections.defaultdict(collections.deque)
+        with open(filename, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[entry["key"]].append(entry)
+
+    def pop(self, key):
+        with self.lock:
+            queue = self.entries.get(key)
+            if not queue:
+                return None
+            # 最後の応答は同じリクエストが繰り返されても返し続ける
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+
+class StubServer(ThreadingHTTPServer):
+    """カセットの応答を返すAPIサーバー
+
+    パスの先頭に元のホスト名を付けたリクエストを受け付ける
+    """
+
+    daemon_threads = True
+
+    def __init__(self, cassette, latency=0.0, address=("127.0.0.1", 0)):
+        self.cassette = cassette
+        self.latency = latency
+        self.stats = Stats()
+        super().__init__(address, StubHandler)
+
+    @property
+    def base_url(self):
+        return "http://{}:{}".format(*self.server_address[:2])
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self._replay()
+
+    def do_POST(self):
+        self._replay()
+
+    def _replay(self):
+        length = int(self.headers.get("content-length") or 0)
+        body = self.rfile.read(length) if length else None
+        host, _, path = self.path.lstrip("/").partition("/")
+        key = request_key(self.command, "https://{}/{}".format(host, path), body)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if (entry := self.server.cassette.pop(key)) is None:
+            content = json.dumps(
+                {"error": {"code": "notrecorded", "info": key}}
+            ).encode("utf-8")
+            self.server.stats.add(len(content), missed=True)
+            self.send_response(404)
+            self.send_header("content-type", "application/json; charset=utf-8")
+        else:
+            if "body_base64" in entry:
+                content = base64.b64decode(entry["body_base64"])
+            else:
+                content = entry["body"].encode("utf-8")
+            self.server.stats.add(len(content))
+            self.send_response(entry["status"])
+            for k, v in entry["headers"].items():
+                self.send_header(k, v)
+        self.send_header("content-length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Replayer:
+    """pywikibotの通信をスタブサーバーへ向け替える"""
+
+    def __init__(self, server):
+        self.server = server
+        self.request = http.session.request
+
+    def install(self):
+        http.session.request = self._request
+
+    def uninstall(self):
+        http.session.request = self.request
+
+    def _request(self, method, url, **kwargs):
+        parts = urlsplit(url)
+        url = "{}/{}{}".format(self.server.base_url, parts.netloc, parts.path)
+        if parts.query:
+            url += "?" + parts.query
+        return self.request(method, url, **kwargs)
+
+
+def run_script(script, args):
+    """スクリプトのmain()を実行し、実行時間を返す"""
+    module = importlib.import_module(script.removesuffix(".py"))
+    start = time.perf_counter()
+    try:
+        module.main(*args)
+    finally:
+        elapsed = time.perf_counter() - start
+    return elapsed
+
+
+def main(*args):
+    """
+    python apicassette.py record <カセット> <スクリプト> [引数...]
+    python apicassette.py replay <カセット> <スクリプト> [-latency:秒] [引数...]
+    """
+    args = list(args or sys.argv[1:])
+    if len(args) < 3 or args[0] not in ("record", "replay"):
+        pywikibot.output(main.__doc__)
+        return
+    mode, filename, script, *script_args = args
+    if mode == "record":
+        recorder = Recorder(filename)
+        recorder.install()
+        try:
+            elapsed = run_script(script, script_args)
+        finally:
+            recorder.uninstall()
+        recorder.stats.report(elapsed)
+        return
+
+    latency = 0.0
+    for arg in script_args:
+        if arg.startswith("-latency:"):
+            latency = float(arg.partition(":")[2])
+            script_args.remove(arg)
+            break
+    server = StubServer(Cassette(filename), latency=latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    replayer = Replayer(server)
+    replayer.install()
+    try:
+        elapsed = run_script(script, script_args)
+    finally:
+        replayer.uninstall()
+        server.shutdown()
+    server.stats.report(elapsed)
+
+
+if __name__ == "__main__":
+    main()
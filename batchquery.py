@@ -0,0 +1,105 @@
+# SeitenBot2 batchquery.py
+
+# MIT License
+#
+# Copyright (c) 2025 Honjitsu-Seiten (https://github.com/Honjitsu-Seiten)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import itertools
+
+from pywikibot.data import api
+from pywikibot.exceptions import InvalidTitleError
+
+
+def query_titles(site, titles, groupsize=50, **params):
+    """複数のタイトルをまとめて問い合わせ、指定したタイトルごとにページ情報を返す
+
+    正規化やリダイレクトの解決を経たページも、指定したタイトルをキーとする
+    """
+    result = {}
+    it = iter(dict.fromkeys(titles))
+    while batch := list(itertools.islice(it, groupsize)):
+        request = site.simple_request(action="query", titles=batch, **params)
+        aliases = {}
+        pages = {}
+        while True:
+            data = request.submit()
+            query = data.get("query", {})
+            for item in query.get("normalized", []) + query.get("redirects", []):
+                aliases[item["from"]] = item["to"]
+            pagedicts = query.get("pages", [])
+            if isinstance(pagedicts, dict):
+                pagedicts = pagedicts.values()
+            for pagedict in pagedicts:
+                # 続きの結果は同じページの辞書にまとめる
+                merged = pages.setdefault(pagedict["title"], pagedict)
+                if merged is pagedict:
+                    continue
+                for key, value in pagedict.items():
+                    if isinstance(value, list):
+                        merged.setdefault(key, []).extend(value)
+                    else:
+                        merged.setdefault(key, value)
+            if "continue" not in data:
+                break
+            request.update(data["continue"])
+        for title in batch:
+            resolved = title
+            seen = {title}
+            while resolved in aliases and aliases[resolved] not in seen:
+                resolved = aliases[resolved]
+                seen.add(resolved)
+            if resolved in pages:
+                result[title] = pages[resolved]
+    return result
+
+
+def load_pages(site, pages, props, groupsize=50, follow_redirects=False, **params):
+    """ページの情報をまとめて取得し、それぞれのページオブジェクトに反映させる
+
+    follow_redirects=Trueであれば、リダイレクトのページについてリダイレクト先の情報もまとめて取得する
+    """
+    pages = {page.title(): page for page in pages}
+    prop = "|".join(props)
+    for title, pagedict in query_titles(
+        site, pages, groupsize, prop=prop, **params
+    ).items():
+        try:
+            api.update_page(pages[title], pagedict, props)
+        except InvalidTitleError:
+            continue
+    if not follow_redirects:
+        return
+    redirects = {
+        title: page for title, page in pages.items() if getattr(page, "_isredir", False)
+    }
+    for title, pagedict in query_titles(
+        site, redirects, groupsize, prop=prop, redirects=True, **params
+    ).items():
+        if pagedict["title"] == title:
+            continue
+        page = redirects[title]
+        target = page.__class__(site, pagedict["title"])
+        try:
+            api.update_page(target, pagedict, props)
+        except InvalidTitleError:
+            continue
+        page._redirtarget = target
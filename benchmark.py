@@ -0,0 +1,250 @@
+# SeitenBot2 benchmark.py
+
+# MIT License
+#
+# Copyright (c) 2025 Honjitsu-Seiten (https://github.com/Honjitsu-Seiten)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import pywikibot
+import mwparserfromhell
+
+import botreq_sendlog
+import kyoudou
+from remove_pptemplate import RemovePpBot2, pptemplate_actions, remove_pptemplates
+from sd_file import FileSdBot, MinorCodeRemover
+
+# 比較の基準となる結果の保存先
+baseline_file = "benchmark_baseline.json"
+
+# 基準よりこの割合以上遅くなるか、メモリ使用量が増えたら警告する
+default_threshold = 1.2
+
+now = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+def signature(rng, days):
+    timestamp = now - timedelta(days=days, minutes=rng.randrange(1440))
+    return kyoudou.iso8601toja(timestamp)
+
+
+def paragraph(rng, words=30):
+    return "".join(
+        rng.choice(("日本語の文章", "[[リンク]]", "'''強調'''", "テキスト", "。"))
+        for _ in range(words)
+    )
+
+
+def make_kyoudou_page(rng, sections=500):
+    """共同翻訳依頼のページを生成する"""
+    fields = ("人文科学", "社会科学", "自然科学", "芸術", "スポーツ")
+    lines = ["{{共同翻訳依頼/ヘッダー}}\n"]
+    for i, field in enumerate(fields):
+        lines.append("== {} ==\n".format(field))
+        for j in range(sections // len(fields) + (i < sections % len(fields))):
+            lines.append("=== [[/項目{}-{}]] ===\n".format(i, j))
+            lines.append(paragraph(rng) + "--[[User:A|A]] ")
+            lines.append(signature(rng, rng.randrange(200)) + "\n")
+            lines.append("'''コメント'''\n")
+            for _ in range(rng.randrange(3)):
+                lines.append(":" + paragraph(rng, 10) + "--[[User:B|B]] ")
+                lines.append(signature(rng, rng.randrange(200)) + "\n")
+    lines.append("== 関連項目 ==\n* [[Wikipedia:翻訳のガイドライン]]\n")
+    return "".join(lines)
+
+
+def make_botreq_page(rng, requests=300):
+    """Bot作業依頼のページを生成する。終了した依頼と終了していない依頼を混ぜる"""
+    lines = ["{{Bot作業依頼/ヘッダー}}\n"]
+    for i in range(requests):
+        lines.append("== 依頼{} ==\n".format(i))
+        lines.append(paragraph(rng) + "--[[User:A|A]] ")
+        lines.append(signature(rng, rng.randrange(60)) + "\n")
+        if rng.random() < 0.8:
+            lines.append(
+                "{{{{{}|--[[User:B|B]] {}}}}}\n".format(
+                    rng.choice(("済み", "解決済み", "失効")),
+                    signature(rng, rng.randrange(30)),
+                )
+            )
+        lines.append("\n")
+    return "".join(lines)
+
+
+def make_file_revisions(rng, revisions=200):
+    """ファイルのページの版を生成する。版ごとに少しずつ本文が変わる"""
+    categories = ["[[Category:画像{}]]".format(i) for i in range(10)]
+    text = (
+        "{{即時削除|ファイル1-5|Example.jpg}}\n"
+        "== 概要 ==\n{{Information\n|Description = " + paragraph(rng) + "\n"
+        "|Source = 自作\n|Date = 2020-01-01\n|Author = [[User:A|A]]\n}}\n"
+        "== ライセンス ==\n{{GFDL}}\n"
+    )
+    texts = []
+    for _ in range(revisions):
+        edit = rng.randrange(3)
+        if edit == 0:
+            text += rng.choice(categories) + "\n"
+        elif edit == 1:
+            text = text.replace("自作", "自作 " + paragraph(rng, 3), 1)
+        else:
+            text += "{{NowCommons|Example.jpg}}\n"
+        texts.append(text)
+    return texts
+
+
+def make_pp_templates(aliases=5):
+    """保護テンプレートと、それぞれのリダイレクトを生成する"""
+    pptemplates = {}
+    for template, action in RemovePpBot2.pptemplates.items():
+        pptemplates[template] = action
+        for i in range(aliases):
+            pptemplates["{}/別名{}".format(template, i)] = action
+    return pptemplates
+
+
+def make_pp_page(rng, pptemplates, templates=200):
+    """保護テンプレートを含むページを生成する"""
+    names = list(pptemplates)
+    lines = []
+    for i in range(templates):
+        if i % 50 == 0:
+            lines.append("{{" + rng.choice(names) + "}}\n")
+        else:
+            lines.append("{{Infobox|name=" + paragraph(rng, 5) + "}}\n")
+        lines.append(paragraph(rng) + "\n")
+    return "".join(lines)
+
+
+def benchmarks(scale):
+    """ベンチマークの名前と、計測する関数を返す"""
+    rng = random.Random(0)
+    kyoudou_text = make_kyoudou_page(rng, 500 * scale)
+    botreq_text = make_botreq_page(rng, 300 * scale)
+    file_texts = make_file_revisions(rng, 200 * scale)
+    minor_templates = {
+        "即時削除",
+        "即時削除/ファイル1-5",
+        "NowCommons",
+    } | FileSdBot.minor_templates
+    pptemplates = make_pp_templates(5 * scale)
+    pp_text = make_pp_page(rng, pptemplates, 200 * scale)
+    actions = pptemplate_actions(pptemplates)
+
+    def remove_minor_codes():
+        remover = MinorCodeRemover(minor_templates)
+        for text in file_texts:
+            remover(text)
+
+    def scan_pptemplates():
+        remove_pptemplates(
+            mwparserfromhell.parse(pp_text), actions, "all", False, False
+        )
+
+    def walk_kyoudou_sections():
+        kyoudou.collect_old_requests(mwparserfromhell.parse(kyoudou_text), 90, now)
+
+    def split_botreq():
+        botreq_sendlog.collect_closed_requests(botreq_text, now)
+
+    return {
+        "sd_file.MinorCodeRemover": remove_minor_codes,
+        "remove_pptemplate.remove_pptemplates": scan_pptemplates,
+        "kyoudou.collect_old_requests": walk_kyoudou_sections,
+        "botreq_sendlog.collect_closed_requests": split_botreq,
+    }
+
+
+def measure(func, repeat):
+    """最も速かった実行時間と、最大のメモリ使用量を返す"""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"time": min(times), "peak": peak}
+
+
+def main(*args):
+    """
+    python benchmark.py [-scale:N] [-repeat:N] [-threshold:R] [-baseline:FILE] [-save]
+
+    -save で結果を基準として保存する
+    """
+    options = {}
+    for arg in args or sys.argv[1:]:
+        arg, _, value = arg.partition(":")
+        options[arg.partition("-")[2]] = value or True
+    scale = int(options.get("scale", 1))
+    repeat = int(options.get("repeat", 5))
+    threshold = float(options.get("threshold", default_threshold))
+    filename = options.get("baseline", baseline_file)
+
+    try:
+        with open(filename, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {}
+
+    results = {}
+    regressions = []
+    for name, func in benchmarks(scale).items():
+        result = results[name] = measure(func, repeat)
+        line = "{:<40} {:>10.2f} ms {:>10.1f} KiB".format(
+            name, result["time"] * 1000, result["peak"] / 1024
+        )
+        if (base := baseline.get(name)) and base.get("scale", 1) == scale:
+            time_ratio = result["time"] / base["time"]
+            peak_ratio = result["peak"] / base["peak"] if base.get("peak") else 1.0
+            line += " (時間 {:+.0%}, メモリ {:+.0%})".format(
+                time_ratio - 1, peak_ratio - 1
+            )
+            if time_ratio > threshold:
+                line += " 遅くなっています"
+            if peak_ratio > threshold:
+                line += " メモリ使用量が増えています"
+            if max(time_ratio, peak_ratio) > threshold:
+                regressions.append(name)
+        pywikibot.output(line)
+        result["scale"] = scale
+
+    if options.get("save"):
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        pywikibot.output("{}に保存しました".format(filename))
+    return not regressions
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -29,8 +29,13 @@ import re
 from datetime import datetime, timedelta, timezone
 import pywikibot
 
+from ratelimit import install_throttle
+
 weekday_ja = ("月", "火", "水", "木", "金", "土", "日")
 wait = 3
+closed_pattern = re.compile(
+    r"\{\{\s*(?:(?:解決)?済み|失効)\s*\|.*?(\d{4})年(\d{1,2})月(\d{1,2})日 \([月火水木金土日]\) (\d{2}):(\d{2}) \(UTC\)\s*\}\}"
+)
 
 
 def iso8601toja(timestamp):
@@ -39,6 +44,21 @@ def iso8601toja(timestamp):
     ) + timestamp.strftime(" %H:%M (UTC)")
 
 
+def collect_closed_requests(text, now=None):
+    """節ごとに分割し、終了から一定期間が過ぎた依頼を年月ごとに集める"""
+    now = now or datetime.now(timezone.utc)
+    botreq_text_list = re.split(r"(==[^=].+?==\n)", text)
+    sendlog_dict = collections.defaultdict(list)
+    it = iter(botreq_text_list[1:])
+    for section_title, section_content in zip(it, it):
+        match = closed_pattern.search(section_content)
+        if match:
+            closed_datetime = datetime(*map(int, match.groups()), tzinfo=timezone.utc)
+            if (now - closed_datetime) > timedelta(days=wait):
+                sendlog_dict[match.group(1, 2)].append((section_title, section_content))
+    return botreq_text_list, sendlog_dict
+
+
 def main(*args):
     """
     Process command line arguments and invoke bot.
@@ -60,6 +80,7 @@ def main(*args):
             pywikibot.output("Disregarding unknown argument %s." % arg)
 
     site = pywikibot.Site(code="ja", fam="wikipedia")
+    install_throttle(site)
     if not site.logged_in():
         site.login()
 
@@ -68,33 +89,10 @@ def main(*args):
     if not botreq.exists():
         pywikibot.error("{} doesn't exist.".format(botreq_title))
         return False
-    botreq_text_list = re.split(r"(==[^=].+?==\n)", botreq.text)
-    it = iter(botreq_text_list)
-    try:
-        next(it)
-    except StopIteration:
+    botreq_text_list, sendlog_dict = collect_closed_requests(botreq.text)
+    if len(botreq_text_list) < 2:
         pywikibot.output("There is no request in {}".format(botreq_title))
         return True
-    closed_pattern = re.compile(
-        r"\{\{\s*(?:(?:解決)?済み|失効)\s*\|.*?(\d{4})年(\d{1,2})月(\d{1,2})日 \([月火水木金土日]\) (\d{2}):(\d{2}) \(UTC\)\s*\}\}"
-    )
-    sendlog_dict = collections.defaultdict(list)
-    while True:
-        try:
-            section_title = next(it)
-            section_content = next(it)
-            match = closed_pattern.search(section_content)
-            if match:
-                closed_datetime = datetime(
-                    *map(int, match.groups()), tzinfo=timezone.utc
-                )
-                now = datetime.now(timezone.utc)
-                if (now - closed_datetime) > timedelta(days=wait):
-                    sendlog_dict[match.group(1, 2)].append(
-                        (section_title, section_content)
-                    )
-        except StopIteration:
-            break
     if not sendlog_dict:
         pywikibot.output("Don't need to do anything.")
         return True
@@ -0,0 +1,105 @@
+# SeitenBot2 checkcache.py
+
+# MIT License
+#
+# Copyright (c) 2025 Honjitsu-Seiten (https://github.com/Honjitsu-Seiten)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import sqlite3
+import threading
+
+import pywikibot
+
+
+class CheckCache:
+    """FileSdBotによる確認結果をsqliteに保存する
+
+    ローカルとコモンズのファイルの最新版が前回の確認時から変わっていなければ、保存された結果を返す
+    """
+
+    def __init__(self, filename):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS checks ("
+                "title TEXT PRIMARY KEY, "
+                "local_revid INTEGER, "
+                "commons_revid INTEGER, "
+                "commons_title TEXT, "
+                "reasons TEXT, "
+                "usage INTEGER, "
+                "import_timestamp TEXT, "
+                "description TEXT)"
+            )
+
+    def get(self, title, local_revid, commons_revid):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT * FROM checks WHERE title = ? "
+                "AND local_revid = ? AND commons_revid = ?",
+                (title, local_revid, commons_revid),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "commons_title": row["commons_title"],
+            "reasons": set(row["reasons"].split()),
+            "usage": bool(row["usage"]),
+            "import_timestamp": pywikibot.Timestamp.fromISOformat(
+                row["import_timestamp"]
+            )
+            if row["import_timestamp"]
+            else None,
+            "description": row["description"],
+        }
+
+    def put(
+        self,
+        title,
+        local_revid,
+        commons_revid,
+        *,
+        commons_title,
+        reasons,
+        usage,
+        import_timestamp,
+        description,
+    ):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO checks VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    title,
+                    local_revid,
+                    commons_revid,
+                    commons_title,
+                    " ".join(sorted(reasons)),
+                    int(usage),
+                    import_timestamp.isoformat() if import_timestamp else None,
+                    description,
+                ),
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
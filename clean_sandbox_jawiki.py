@@ -26,6 +26,8 @@
 import re
 import pywikibot
 
+from ratelimit import install_throttle
+
 
 def main(*args):
     """
@@ -51,6 +53,7 @@ def main(*args):
     assert revlimit >= 1 and revlimit <= 5000
 
     site = pywikibot.Site(code="ja", fam="wikipedia")
+    install_throttle(site)
     if not site.logged_in():
         site.login()
 
@@ -27,6 +27,8 @@ import re
 from datetime import datetime, timezone, timedelta
 import pywikibot
 
+from ratelimit import install_throttle
+
 
 def main(*args):
     """
@@ -49,6 +51,7 @@ def main(*args):
             options[option] = value
 
     site = pywikibot.Site(code="ja", fam="wikipedia")
+    install_throttle(site)
     if not site.logged_in():
         site.login()
 
@@ -30,7 +30,13 @@ from datetime import datetime, timedelta, timezone
 import pywikibot
 import mwparserfromhell
 
+from ratelimit import install_throttle
+
 weekday_ja = ("月", "火", "水", "木", "金", "土", "日")
+signature_pattern = re.compile(
+    r"(\d{4})年(\d{1,2})月(\d{1,2})日 \([月火水木金土日]\) (\d{2}):(\d{2}) \(UTC\)$",
+    re.M,
+)
 
 
 def iso8601toja(timestamp):
@@ -64,6 +70,7 @@ def main(*args):
     waitold = int(options.pop("waitold", 90))
 
     site = pywikibot.Site(code="ja", fam="wikipedia")
+    install_throttle(site)
     if not site.logged_in():
         site.login()
 
@@ -102,23 +109,11 @@ def finishedlist(site, wait, show_diff):
     finishedpage.save(summary="Botによる: 掲載期限切れの項目を除去", minor=False)
 
 
-def oldrequest(site, wait, show_diff):
-    kyoudou_title = "Wikipedia:共同翻訳依頼"
-    old_title = "Wikipedia:共同翻訳依頼/古い依頼"
-
-    # 古い依頼を探す
-    kyoudou = pywikibot.Page(site, kyoudou_title)
-    if not kyoudou.exists():
-        pywikibot.error("{} doesn't exist.".format(kyoudou_title))
-        return
-    kyoudou_oldtext = kyoudou.text
-    signature_pattern = re.compile(
-        r"(\d{4})年(\d{1,2})月(\d{1,2})日 \([月火水木金土日]\) (\d{2}):(\d{2}) \(UTC\)$",
-        re.M,
-    )
+def collect_old_requests(kyoudou_code, wait, now=None):
+    """署名が全て一定期間より前の依頼を分野ごとに集め、本文から除去する"""
+    now = now or datetime.now(timezone.utc)
     old_dict = collections.defaultdict(list)
     old_request_count = 0
-    kyoudou_code = mwparserfromhell.parse(kyoudou.text)
     for field in kyoudou_code.get_sections(
         levels=(2,), matches=lambda h: h.strip() != "関連項目", include_lead=False
     ):
@@ -129,13 +124,27 @@ def oldrequest(site, wait, show_diff):
                 signature_datetime = datetime(
                     *map(int, match.groups()), tzinfo=timezone.utc
                 )
-                now = datetime.now(timezone.utc)
                 if (now - signature_datetime) < timedelta(days=wait):
                     break
             else:
                 old_request_count += 1
                 old_dict[field_name].append(str(request))
                 kyoudou_code.remove(request)
+    return old_dict, old_request_count
+
+
+def oldrequest(site, wait, show_diff):
+    kyoudou_title = "Wikipedia:共同翻訳依頼"
+    old_title = "Wikipedia:共同翻訳依頼/古い依頼"
+
+    # 古い依頼を探す
+    kyoudou = pywikibot.Page(site, kyoudou_title)
+    if not kyoudou.exists():
+        pywikibot.error("{} doesn't exist.".format(kyoudou_title))
+        return
+    kyoudou_oldtext = kyoudou.text
+    kyoudou_code = mwparserfromhell.parse(kyoudou.text)
+    old_dict, old_request_count = collect_old_requests(kyoudou_code, wait)
     if not old_dict:
         pywikibot.output("古い依頼はありません。")
         return
@@ -0,0 +1,177 @@
+# SeitenBot2 ratelimit.py
+
+# MIT License
+#
+# Copyright (c) 2025 Honjitsu-Seiten (https://github.com/Honjitsu-Seiten)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import contextlib
+import threading
+import time
+
+import pywikibot
+from pywikibot import config
+from pywikibot.exceptions import Error
+from pywikibot.throttle import Throttle
+
+# 負荷を示す応答の後に速度を下げる割合と、その下限
+backoff_ratio = 0.5
+min_factor = 1 / 32
+# この回数だけ正常な応答が続いたら速度を戻す
+recover_after = 10
+
+# 種類ごとのレート制限を確認する操作
+ratelimit_actions = {"write": "edit", "delete": "delete"}
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self, rate):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+
+class AdaptiveThrottle(Throttle):
+    """読み込み・書き込み・削除を区別するトークンバケット式のスロットル
+
+    maxlagやRetry-Afterによって速度を下げ、正常な応答が続けば元の速度に戻す
+    """
+
+    def __init__(self, site, *, read_rate=None, write_rate=None, delete_rate=None):
+        self.site = site
+        self.factor = 1.0
+        self.healthy = 0
+        self.blocked_until = 0.0
+        self._retry_after = 0
+        write_rate = write_rate or 1 / config.put_throttle
+        self.buckets = {
+            "read": TokenBucket(
+                read_rate or 1 / max(config.minthrottle, 0.01), capacity=5
+            ),
+            "write": TokenBucket(write_rate),
+            "delete": TokenBucket(delete_rate or write_rate),
+        }
+        self.seeded = set()
+        self.local = threading.local()
+        super().__init__(site)
+
+    @property
+    def retry_after(self):
+        return self._retry_after
+
+    @retry_after.setter
+    def retry_after(self, value):
+        # 通信のたびに設定されるため、サーバーの状態の指標として使う
+        self._retry_after = value
+        if value:
+            self.backoff(value)
+        else:
+            self.recover()
+
+    def backoff(self, seconds=None):
+        """速度を下げ、指定された秒数の間はアクセスを控える"""
+        with self.lock:
+            self.factor = max(self.factor * backoff_ratio, min_factor)
+            self.healthy = 0
+            if seconds:
+                self.blocked_until = max(
+                    self.blocked_until,
+                    time.time() + min(seconds, config.retry_max),
+                )
+        pywikibot.log("{}: 速度を{:.3f}倍に下げます".format(self.mysite, self.factor))
+
+    def recover(self):
+        with self.lock:
+            if self.factor >= 1.0:
+                return
+            self.healthy += 1
+            if self.healthy < recover_after:
+                return
+            self.factor = min(self.factor / backoff_ratio, 1.0)
+            self.healthy = 0
+        pywikibot.log("{}: 速度を{:.3f}倍に戻します".format(self.mysite, self.factor))
+
+    def lag(self, lagtime=None):
+        self.backoff(lagtime or config.retry_wait)
+
+    def _seed(self, kind):
+        """アカウントに課されたレート制限を超えないようにする"""
+        self.seeded.add(kind)
+        try:
+            limit = self.site.ratelimit(ratelimit_actions[kind])
+        except Error:
+            return
+        if limit.seconds and limit.hits:
+            bucket = self.buckets[kind]
+            bucket.rate = min(bucket.rate, limit.hits / limit.seconds)
+
+    def acquire(self, kind="read"):
+        """指定した種類のトークンを1つ消費する。足りなければ補充されるまで待つ"""
+        if kind in ratelimit_actions and kind not in self.seeded:
+            self._seed(kind)
+        if time.time() > self.checktime + self.checkdelay:
+            self.checkMultiplicity()
+        bucket = self.buckets[kind]
+        with bucket.lock:
+            while True:
+                rate = bucket.rate * self.factor / self.process_multiplicity
+                bucket.refill(rate)
+                wait = self.blocked_until - time.time()
+                if wait <= 0:
+                    if bucket.tokens >= 1:
+                        bucket.tokens -= 1
+                        break
+                    wait = (1 - bucket.tokens) / rate
+                self.wait(wait)
+        if kind == "read":
+            self.last_read = time.time()
+        else:
+            self.last_write = time.time()
+
+    @contextlib.contextmanager
+    def paced_as(self, kind):
+        """このスレッドの通信を、書き込みであっても指定した種類として扱う"""
+        previous = getattr(self.local, "kind", None)
+        self.local.kind = kind
+        try:
+            yield
+        finally:
+            self.local.kind = previous
+
+    def __call__(self, *, requestsize=1, write=False):
+        kind = getattr(self.local, "kind", None)
+        self.acquire(kind or ("write" if write else "read"))
+
+
+def install_throttle(site, **rates):
+    """siteのスロットルをAdaptiveThrottleに置き換える"""
+    throttle = getattr(site, "_throttle", None)
+    if not isinstance(throttle, AdaptiveThrottle):
+        throttle = AdaptiveThrottle(site, **rates)
+        site._throttle = throttle
+    return throttle
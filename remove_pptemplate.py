@@ -23,25 +23,108 @@
 # SOFTWARE.
 
 
+import itertools
+import json
+import os
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import suppress
 import pywikibot
-from pywikibot.pagegenerators import GeneratorFactory
+from pywikibot.data import api
+from pywikibot.pagegenerators import GeneratorFactory, PreloadingGenerator
 from pywikibot.bot import SingleSiteBot, CurrentPageBot
 from pywikibot.exceptions import Error
 import mwparserfromhell
 
+from batchquery import load_pages
+from ratelimit import install_throttle
+from templatealias import TemplateAliasIndex, default_ttl, normalize_template_name
+
 
 def levelnum(level):
     return ["all", "autoconfirmed", "extendedconfirmed", "sysop"].index(level)
 
 
+def pptemplate_actions(pptemplates):
+    """正規化したテンプレート名から保護の種類を引く辞書を返す"""
+    return {
+        normalize_template_name(pptemplate): action
+        for pptemplate, action in pptemplates.items()
+    }
+
+
+def pptemplate_pattern(pptemplates):
+    """保護テンプレートの呼び出しの候補を探す正規表現を返す
+
+    構文解析の前に、保護テンプレートを含みえないページを除くために使う
+    """
+    names = []
+    for pptemplate in sorted(
+        {normalize_template_name(t) for t in pptemplates}, key=len, reverse=True
+    ):
+        first = pptemplate[0]
+        # 先頭の文字の大文字・小文字と、空白・下線を区別しない
+        head = (
+            "[{}{}]".format(re.escape(first.upper()), re.escape(first.lower()))
+            if first.upper() != first.lower()
+            else re.escape(first)
+        )
+        names.append(
+            head + "[ _]+".join(re.escape(word) for word in pptemplate[1:].split(" "))
+        )
+    return re.compile(r"\{\{(?:\s|<!--.*?-->)*(?:" + "|".join(names) + ")", re.S)
+
+
+def remove_pptemplates(
+    wikicode, actions, editlevel, needmovetemplate, needuploadtemplate
+):
+    """不要になった保護テンプレートを除去し、除去したかどうかを返す
+
+    actionsはpptemplate_actions()で作った辞書とする
+    """
+    removed = False
+    for template in wikicode.filter_templates():
+        action = actions.get(normalize_template_name(template.name.strip_code()))
+        if action is None:
+            continue
+        pywikibot.output(str(template.name))
+        with suppress(ValueError):
+            action = template.get("action").value
+        if (
+            action == "edit"
+            and editlevel == "all"
+            or action == "move"
+            and not needmovetemplate
+            or action == "upload"
+            and not needuploadtemplate
+        ):
+            with suppress(ValueError):
+                wikicode.remove(str(template) + "\n")
+                removed = True
+            with suppress(ValueError):
+                wikicode.remove(template)
+                removed = True
+    return removed
+
+
 class RemovePpBot2(SingleSiteBot, CurrentPageBot):
-    update_options = {"summary": "Botによる: 保護テンプレートの除去"}
+    update_options = {
+        "summary": "Botによる: 保護テンプレートの除去",
+        "aliasttl": default_ttl,
+        "incremental": False,
+        "workers": 0,
+    }
 
     pattern1 = re.compile(r"<noinclude></noinclude>")
     pattern2 = re.compile(r"/\*[ 　\t]*\*/\n?")
 
+    # 保護の情報をまとめて取得するページ数
+    preload_size = 50
+
+    # まとめてパージするページ数
+    purge_size = 50
+
     pptemplates = {
         "Pp": "edit",
         "Pp-move": "move",
@@ -64,16 +147,152 @@ class RemovePpBot2(SingleSiteBot, CurrentPageBot):
     }
 
     def setup(self):
-        pptemplates_redirect = {}
-        for template, action in self.pptemplates.items():
-            templatepage = pywikibot.Page(source=self.site, title=template, ns=10)
-            for redirect in self.site.pagebacklinks(
-                templatepage, filter_redirects=True, namespaces=10
+        install_throttle(self.site)
+        self.purge_queue = []
+        # 保護の記録を読んだ位置と、保護の期限を保存する
+        self.state_file = pywikibot.config.datafilepath("remove_pptemplate_state.json")
+        self.protection_state = None
+        if self.generator is None and self.opt.incremental:
+            self.generator = PreloadingGenerator(self._changed_protections())
+        self.generator = self._preload_protection(self.generator)
+        self.prepared = {}
+        self.skip_decisions = {}
+        self.workers = int(self.opt.workers)
+        if self.workers > 0 and not self.opt.always:
+            # 先のページの出力が差分の表示や確認と混ざるため
+            pywikibot.warning("-workersは-alwaysと併用してください")
+            self.workers = 0
+        if self.workers > 0:
+            self.generator = self._parallel(self.generator)
+        template_aliases = TemplateAliasIndex(
+            self.site, self.pptemplates, ttl=float(self.opt.aliasttl)
+        )
+        self.pptemplates = {
+            alias: action
+            for template, action in self.pptemplates.items()
+            for alias in template_aliases.aliases(template)
+        }
+        self.pptemplate_actions = pptemplate_actions(self.pptemplates)
+        self.pptemplate_pattern = pptemplate_pattern(self.pptemplates)
+
+    def _changed_protections(self):
+        """前回の実行以降に保護が変わりえたページを返す
+
+        保護の記録に載ったページに加え、保存しておいた保護の期限が過ぎたページも返す
+        """
+        now = self.site.server_time()
+        self.protection_state = state = self._load_protection_state()
+        expiries = state["expiries"]
+        if state["cursor"] is None:
+            # 初回は現在の保護の期限を記録するのみとする
+            self._seed_expiries(expiries)
+            state["cursor"] = now.isoformat()
+            pywikibot.output("保護の期限を記録しました。次回の実行から対象となります")
+            return
+        titles = {}
+        for entry in self.site.logevents(
+            logtype="protect",
+            start=pywikibot.Timestamp.fromISOformat(state["cursor"]),
+            end=now,
+            reverse=True,
+        ):
+            if not (title := entry.data.get("title")):
+                continue
+            titles[title] = None
+            params = entry.data.get("params", {})
+            action = entry.action()
+            if action == "unprotect":
+                expiries.pop(title, None)
+            elif action == "move_prot":
+                # 移動では保護の期限が移動先に引き継がれる
+                if oldtitle := params.get("oldtitle_title"):
+                    titles[oldtitle] = None
+                    if oldtitle in expiries:
+                        expiries[title] = expiries.pop(oldtitle)
+            else:
+                # 保護の変更では全ての種類の期限が改めて記録されるため、置き換える
+                if dates := [
+                    detail["expiry"]
+                    for detail in params.get("details", [])
+                    if detail.get("expiry") not in (None, "infinite", "infinity")
+                ]:
+                    expiries[title] = dates
+                else:
+                    expiries.pop(title, None)
+        for title, dates in list(expiries.items()):
+            rest = [d for d in dates if pywikibot.Timestamp.fromISOformat(d) > now]
+            if len(rest) < len(dates):
+                titles[title] = None
+            if rest:
+                expiries[title] = rest
+            else:
+                del expiries[title]
+        state["cursor"] = now.isoformat()
+        pywikibot.output("{}ページの保護が変わりえます".format(len(titles)))
+        for title in titles:
+            yield pywikibot.Page(self.site, title)
+
+    def _seed_expiries(self, expiries):
+        """現在の保護のうち、期限のあるものを記録する"""
+        for prtype in ("edit", "move", "upload"):
+            for item in self.site._generator(
+                api.ListGenerator, "protectedpages", prtype=prtype, prprop="expiry"
             ):
-                pptemplates_redirect[redirect.title(with_ns=False)] = action
-        self.pptemplates.update(pptemplates_redirect)
+                if item.get("expiry") not in (None, "infinite", "infinity"):
+                    expiries.setdefault(item["title"], []).append(item["expiry"])
+
+    def _load_protection_state(self):
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"cursor": None, "expiries": {}}
+
+    def _save_protection_state(self):
+        with open(self.state_file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.protection_state, f, ensure_ascii=False)
+        os.replace(self.state_file + ".tmp", self.state_file)
+
+    def _parallel(self, generator):
+        """先のページの本文の計算を別スレッドで行いながら、ページを順に返す
+
+        保存は呼び出し元のスレッドで、ページの順に行う
+        省略するページは、先に判定して計算しない
+        """
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = deque()
+        try:
+            for page in generator:
+                skip = self.skip_decisions[page] = self.skip_page(page)
+                future = None if skip else executor.submit(self._prepare, page)
+                pending.append((page, future))
+                if len(pending) > self.workers * 2:
+                    page, future = pending.popleft()
+                    self.prepared = {page: future} if future else {}
+                    yield page
+            while pending:
+                page, future = pending.popleft()
+                self.prepared = {page: future} if future else {}
+                yield page
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _preload_protection(self, generator):
+        """ページの保護の情報をまとめて取得しながら、ページを返す"""
+        generator = iter(generator)
+        while batch := list(itertools.islice(generator, self.preload_size)):
+            load_pages(
+                self.site,
+                [page for page in batch if not hasattr(page, "_protection")],
+                ("info",),
+                inprop="protection",
+            )
+            yield from batch
 
     def skip_page(self, page):
+        # 先に判定していれば、その結果を使う
+        if (skip := self.skip_decisions.pop(page, None)) is not None:
+            return skip
         if page.namespace() in ("利用者:", "Mediawiki:", "モジュール:"):
             return True
         if page.title() in (
@@ -88,15 +307,42 @@ class RemovePpBot2(SingleSiteBot, CurrentPageBot):
 
     def treat_page(self):
         """Treat page."""
-        page = self.current_page
+        if future := self.prepared.pop(self.current_page, None):
+            result = future.result()
+        else:
+            result = self._prepare(self.current_page)
+        if result is None:
+            return
+        if result is False:
+            self._purge(self.current_page)
+            return
+        self.put_current(
+            new_text=result,
+            summary=self.opt.summary,
+            show_diff=not self.opt.always,
+            ignore_save_related_errors=True,
+        )
+
+    def _prepare(self, page):
+        """除去後の本文を返す。除去するものがなければFalse、取得に失敗すればNoneを返す
+
+        書き込みは行わないため、別スレッドからも呼び出せる
+        """
         title = page.title()
         ns = page.namespace()
         try:
             pagetext = page.get(get_redirect=True)
+        except Error as e:
+            pywikibot.error(str(e))
+            return None
+        if not self.pptemplate_pattern.search(pagetext):
+            # 保護テンプレートを含まないページは構文解析を省略する
+            return False
+        try:
             protection = page.protection()
         except Error as e:
             pywikibot.error(str(e))
-            return
+            return None
         needmovetemplate = needuploadtemplate = False
         editlevel = protection.get("edit", ("all",))[0]
         pywikibot.output("edit: " + editlevel)
@@ -114,42 +360,48 @@ class RemovePpBot2(SingleSiteBot, CurrentPageBot):
             ):
                 needuploadtemplate = True
         wikicode = mwparserfromhell.parse(pagetext)
-        removed = False
-        for template in wikicode.filter_templates():
-            for pptemplate, action in self.pptemplates.items():
-                if template.name.matches(pptemplate):
-                    pywikibot.output(str(template.name))
-                    with suppress(ValueError):
-                        action = template.get("action").value
-                    if (
-                        action == "edit"
-                        and editlevel == "all"
-                        or action == "move"
-                        and not needmovetemplate
-                        or action == "upload"
-                        and not needuploadtemplate
-                    ):
-                        with suppress(ValueError):
-                            wikicode.remove(str(template) + "\n")
-                            removed = True
-                        with suppress(ValueError):
-                            wikicode.remove(template)
-                            removed = True
+        removed = remove_pptemplates(
+            wikicode,
+            self.pptemplate_actions,
+            editlevel,
+            needmovetemplate,
+            needuploadtemplate,
+        )
         new_text = str(wikicode)
 
-        if removed:
-            if (ns == "Template:") and title.endswith(".css"):
-                new_text = self.pattern2.sub("", new_text)
-            else:
-                new_text = self.pattern1.sub("", new_text)
-            self.put_current(
-                new_text=new_text,
-                summary=self.opt.summary,
-                show_diff=not self.opt.always,
-                ignore_save_related_errors=True,
-            )
-        else:
-            page.touch()
+        if not removed:
+            return False
+        if (ns == "Template:") and title.endswith(".css"):
+            return self.pattern2.sub("", new_text)
+        return self.pattern1.sub("", new_text)
+
+    def _purge(self, page):
+        """リンクの更新を、まとめて行うために溜めておく"""
+        self.purge_queue.append(page)
+        if len(self.purge_queue) >= self.purge_size:
+            self._flush_purge()
+
+    def _flush_purge(self):
+        """溜めたページをまとめてパージし、リンクを更新する
+
+        書き込みの枠は実際の編集のために残し、読み込みとして速度を制御する
+        """
+        pages, self.purge_queue = self.purge_queue, []
+        if not pages:
+            return
+        with self.site.throttle.paced_as("read"):
+            if not self.site.purgepages(pages, forcelinkupdate=True):
+                pywikibot.warning(
+                    "リンクを更新できなかったページがあります: {}".format(
+                        ", ".join(page.title() for page in pages)
+                    )
+                )
+
+    def teardown(self):
+        self._flush_purge()
+        # 最後まで処理した場合のみ、次回の開始位置を進める
+        if self.protection_state is not None and self.generator_completed:
+            self._save_protection_state()
 
 
 def main(*args):
@@ -165,11 +417,11 @@ def main(*args):
     for arg in local_args:
         arg, _, value = arg.partition(":")
         option = arg[1:]
-        options[option] = True
+        options[option] = value or True
 
     generator = generator_factory.getCombinedGenerator(preload=True)
 
-    if generator:
+    if generator or options.get("incremental"):
         bot = RemovePpBot2(generator=generator, site=site, **options)
         bot.run()
     else:
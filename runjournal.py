@@ -0,0 +1,97 @@
+# SeitenBot2 runjournal.py
+
+# MIT License
+#
+# Copyright (c) 2025 Honjitsu-Seiten (https://github.com/Honjitsu-Seiten)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import json
+import os
+import threading
+
+
+def read_entries(filename):
+    """記録を読み込む。ファイルがなければ空のリストを返す"""
+    entries = []
+    try:
+        with open(filename, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # 書き込み途中で止まった行は無視する
+                    continue
+    except OSError:
+        pass
+    return entries
+
+
+def read_outcomes(filename):
+    """書き込み用に開かずに記録を読み込み、ファイルごとの最後の結果を返す
+
+    ファイルがなければNoneを返す
+    """
+    if not os.path.exists(filename):
+        return None
+    return {entry["title"]: entry for entry in read_entries(filename)}
+
+
+class RunJournal:
+    """ファイルごとの処理結果を、決まり次第ファイルに追記する
+
+    実行が途中で止まっても、次の実行で結果を引き継げるようにする
+    """
+
+    def __init__(self, filename, resume=False, discard=False):
+        """resumeでなければ新しく記録し直す
+
+        前回の記録が残っていれば、discardを指定しない限りFileExistsErrorを送出する
+        """
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.entries = read_entries(filename)
+        if not resume:
+            if self.entries and not discard:
+                raise FileExistsError(filename)
+            self.entries = []
+        self.file = open(filename, "a" if resume else "w", encoding="utf-8")
+
+    def record(self, title, outcome, reasons=(), commons_title=None):
+        entry = {
+            "title": title,
+            "outcome": outcome,
+            "reasons": sorted(reasons),
+            "commons_title": commons_title,
+        }
+        with self.lock:
+            self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def outcomes(self):
+        """前回の実行で記録された、ファイルごとの最後の結果を返す"""
+        return {entry["title"]: entry for entry in self.entries}
+
+    def close(self, remove=False):
+        with self.lock:
+            self.file.close()
+            if remove:
+                os.remove(self.filename)
@@ -23,14 +23,22 @@
 # SOFTWARE.
 
 
+import copy
+import functools
+import hashlib
 import io
+import itertools
+import json
+import os
+import queue
 import re
-import time
-from collections import defaultdict
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 import pywikibot
 from pywikibot.exceptions import Error
-from pywikibot.pagegenerators import GeneratorFactory, PetScanPageGenerator
+from pywikibot.pagegenerators import GeneratorFactory
 from pywikibot.data import api
 from pywikibot.bot import SingleSiteBot, CurrentPageBot
 from pywikibot.tools.chars import url2string
@@ -38,27 +46,189 @@ from pywikibot.tools.chars import url2string
 import mwparserfromhell
 from mwparserfromhell.nodes.template import Template
 from mwparserfromhell.nodes.wikilink import Wikilink
-from mwparserfromhell.wikicode import Wikicode
+
+from batchquery import load_pages, query_titles
+from checkcache import CheckCache
+from ratelimit import install_throttle
+from runjournal import RunJournal, read_outcomes
+from skiplist import SkipList, normalize_title
+from stagemetrics import StageMetrics
+from templatealias import TemplateAliasIndex, default_ttl, normalize_template_name
 
 skip_listpage = "利用者:SeitenBot2/即時削除を見送ったファイル"
+target_category = "コモンズへの移動により即時削除対象となったファイル"
 
 
-def get_seitenbot2_table2(wikicode: Wikicode):
-    result = wikicode.filter_templates(
-        matches=lambda x: (
-            x.name.matches("Table2")
-            and "seitenbot2" in str(x.get("class").value).split()
-        )
-    )
-    if not result:
-        pywikibot.error("一覧表が見つかりません")
-        raise ValueError("一覧表が見つかりません")
-    return result[0]
+class MinorCodeRemover:
+    """カテゴリや特定のテンプレートといった、コモンズへ反映させる必要のないものを除去する
+
+    テンプレート名は正規化した集合で照合し、同じ本文に対する結果はキャッシュする
+    """
+
+    # テンプレートやカテゴリを含まない本文は構文解析を省略する
+    markup_pattern = re.compile(r"\{\{|\[\[(?:category|カテゴリ):", re.I)
+
+    def __init__(self, templates, maxsize=1024):
+        self.templates = {normalize_template_name(t) for t in templates}
+        self.remove = functools.lru_cache(maxsize=maxsize)(self._remove)
+
+    def __call__(self, text):
+        return self.remove(text)
+
+    def _remove(self, text):
+        text = text.strip()
+        if self.markup_pattern.search(text):
+            code = mwparserfromhell.parse(text)
+            for node in code.ifilter(recursive=False):
+                if isinstance(node, Wikilink) and node.title.lower().startswith(
+                    ("category:", "カテゴリ:")
+                ):
+                    code.remove(node)
+                elif (
+                    isinstance(node, Template)
+                    and normalize_template_name(node.name.strip_code())
+                    in self.templates
+                ):
+                    code.remove(node)
+            text = str(code)
+        return re.sub(r"\W+", "", text)
+
+
+class HistoryMemo:
+    """ファイルの版と編集履歴を、ページごとに一度だけ取得して保持する"""
+
+    def __init__(self):
+        self.file_histories = {}
+        self.page_revisions = {}
+
+    def preload(self, pages):
+        """全ての版を取得済みのページについて、ファイルの版を保持する
+
+        リダイレクトであれば、リダイレクト先のページも対象とする
+        """
+        for page in pages:
+            for target in (page, getattr(page, "_redirtarget", None)):
+                if revisions := getattr(target, "_file_revisions", None):
+                    self.file_histories[target] = [
+                        revisions[k] for k in sorted(revisions)
+                    ]
+
+    def file_history(self, page):
+        """ファイルの版を古い順に返す"""
+        if page not in self.file_histories:
+            # 最新版のみ取得したページもあるため、全ての版を取得し直す
+            page.site.loadimageinfo(page, history=True)
+            self.file_histories[page] = [
+                page._file_revisions[k] for k in sorted(page._file_revisions)
+            ]
+        return self.file_histories[page]
+
+    def revisions(self, page):
+        """編集履歴を古い順に返す。本文は含まない"""
+        if page not in self.page_revisions:
+            self.page_revisions[page] = tuple(
+                page.revisions(reverse=True, content=False)
+            )
+        return self.page_revisions[page]
+
+    def discard(self, *pages):
+        for page in pages:
+            self.file_histories.pop(page, None)
+            self.page_revisions.pop(page, None)
 
 
 class FileSdBot(SingleSiteBot, CurrentPageBot):
+    update_options = {
+        "ignorelist": False,
+        "recent": False,
+        "prefetch": 50,
+        "lookahead": 0,
+        "nocache": False,
+        "aliasttl": default_ttl,
+        "metrics": "",
+        "deletequeue": False,
+        "limit": None,
+        "resume": False,
+        "discardjournal": False,
+        "shard": "",
+        "mergeshards": 0,
+        "deletionlog": False,
+    }
+
+    # 移動ログを辿る回数の上限
+    max_move_hops = 10
+
+    # 削除キューに溜めておける削除の量(秒数)。これを超えると検証を待たせる
+    delete_backlog = 60
+
+    # 一覧の更新時に、コモンズのファイルの初版を並行して取得する数
+    teardown_workers = 4
+
+    # コモンズの移入日時より後の編集のうち、無視する利用者
+    ignored_users = ("MGA73", "MGA73bot")
+
+    # 即時削除・NowCommonsのテンプレートのほかに、コモンズへ反映させる必要のないテンプレート
+    minor_templates = {
+        "コモンズへの移動推奨",
+        "GFDL",
+        "GFDL-ja",
+        "Self",
+        "Copy to Wikimedia Commons",
+        "MTC",
+    }
+
     def setup(self):
         self.ignorelist = self.opt.get("ignorelist", False)
+        self.cursor = None
+        # カテゴリに追加された日時を、処理を終えたファイルについてのみ次回の開始位置に反映させる
+        self.added_timestamps = {}
+        self.shard = None
+        if self.opt.shard:
+            index, _, count = self.opt.shard.partition("/")
+            self.shard = (int(index), int(count))
+            if not 1 <= self.shard[0] <= self.shard[1]:
+                raise ValueError("-shardは1/8のように指定してください")
+        # 開始位置はシャードごとに保存する
+        self.cursor_file = pywikibot.config.datafilepath(
+            "sd_file_cursor{}.json".format(self._shard_suffix())
+        )
+        self.merge_shards = int(self.opt.mergeshards or 0)
+        if self.merge_shards:
+            # 各シャードの結果をまとめて一覧を更新するのみで、ファイルは処理しない
+            self.generator = iter(())
+        elif self.generator is None:
+            self.generator = self._category_members()
+        self.prefetch_size = min(int(self.opt.prefetch), 50)
+        self.commons_pages = {}
+        if self.prefetch_size > 0:
+            self.generator = self._prefetch(self.generator)
+        self.lookahead = int(self.opt.lookahead)
+        if self.lookahead > 0 and not self.opt.always:
+            pywikibot.warning("-lookaheadは-alwaysと併用してください")
+            self.lookahead = 0
+        self.verified = {}
+        self.lookahead_executor = None
+        self.history = HistoryMemo()
+        self.metrics = StageMetrics(
+            self.opt.metrics
+            or pywikibot.config.datafilepath("sd_file_metrics" + self._shard_suffix())
+        )
+        if self.lookahead > 0:
+            self.generator = self._lookahead(self.generator)
+        self.delete_queue = None
+        if self.opt.deletequeue:
+            if self.opt.always:
+                rate = install_throttle(self.site).buckets["delete"].rate
+                self.delete_queue = queue.Queue(
+                    maxsize=max(4, int(rate * self.delete_backlog))
+                )
+                self.delete_failures = []
+                self.delete_thread = threading.Thread(
+                    target=self._delete_worker, daemon=True
+                )
+                self.delete_thread.start()
+            else:
+                pywikibot.warning("-deletequeueは-alwaysと併用してください")
 
         self.import_log_pattern = re.compile(
             r"^Imported with FileImporter from https\://ja\.wikipedia\.org/wiki/(.+?)$"
@@ -74,7 +244,15 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
             "OtherIssue": "Z",
         }
         self.skipped = defaultdict(lambda: [set(), None])
+        self.check_cache = (
+            None
+            if self.opt.nocache
+            else CheckCache(pywikibot.config.datafilepath("sd_file_cache.sqlite3"))
+        )
         self.commons_site = pywikibot.Site(code="commons", fam="commons")
+        install_throttle(self.site)
+        install_throttle(self.commons_site)
+        self._open_journal()
         self.except_categories = (
             "自由利用できない画像屋外美術を含む画像",
             "屋外美術写真の利用方針に違反している画像",
@@ -88,68 +266,116 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
             "即時削除対象のページ",
         )
 
-        self.sdtemplates = {"即時削除"}  # set
-        sdtemplate_redirects = set()
-        for template in self.sdtemplates:
-            templatepage = pywikibot.Page(source=self.site, title=template, ns=10)
-            for redirect in self.site.pagebacklinks(
-                templatepage, filter_redirects=True, namespaces=10
-            ):
-                sdtemplate_redirects.add(redirect.title(with_ns=False))
-        self.sdtemplates.update(sdtemplate_redirects)
-        self.sdtemplates_f = {"即時削除/ファイル1-5"}  # set
-        sdtemplate_f_redirects = set()
+        template_aliases = TemplateAliasIndex(
+            self.site,
+            ("即時削除", "即時削除/ファイル1-5", "NowCommons"),
+            ttl=float(self.opt.aliasttl),
+        )
+        self.sdtemplates = template_aliases.aliases("即時削除")
+        self.sdtemplates_f = template_aliases.aliases("即時削除/ファイル1-5")
         self.valid_reasons = set()
-        for template in self.sdtemplates_f:
-            templatepage = pywikibot.Page(source=self.site, title=template, ns=10)
-            for redirect in self.site.pagebacklinks(
-                templatepage, filter_redirects=True, namespaces=10
-            ):
-                redirect_title = redirect.title(with_ns=False)
-                sdtemplate_f_redirects.add(redirect_title)
-                if m := re.match(r"即時削除2?/(.+)$", redirect_title):
-                    self.valid_reasons.add(m.group(1))
-        self.sdtemplates_f.update(sdtemplate_f_redirects)
-        self.nowcommons_templates = {"NowCommons"}  # set
-        nowcommons_redirects = set()
-        for template in self.nowcommons_templates:
-            templatepage = pywikibot.Page(source=self.site, title=template, ns=10)
-            for redirect in self.site.pagebacklinks(
-                templatepage, filter_redirects=True, namespaces=10
-            ):
-                nowcommons_redirects.add(redirect.title(with_ns=False))
-        self.nowcommons_templates.update(nowcommons_redirects)
+        for redirect_title in template_aliases.redirects["即時削除/ファイル1-5"]:
+            if m := re.match(r"即時削除2?/(.+)$", redirect_title):
+                self.valid_reasons.add(m.group(1))
+        self.nowcommons_templates = template_aliases.aliases("NowCommons")
+        self.minor_code_remover = MinorCodeRemover(
+            self.sdtemplates
+            | self.sdtemplates_f
+            | self.nowcommons_templates
+            | self.minor_templates
+        )
         if self.ignorelist:
             return
         self.skipped_listpage = pywikibot.Page(source=self.site, title=skip_listpage)
         self.skipped_listpage.clear_cache()
+        if not self.opt.deletionlog:
+            # 一覧に載っているファイルのみ、存在するかをまとめて確認する
+            self.skip_list = SkipList(self.skipped_listpage.text)
+            for title in self.get_missingfiles(self.skip_list.titles()):
+                self.skip_list.remove(title)
+            return
         self.site.loadrevisions(self.skipped_listpage, user="SeitenBot2", total=1)
         already_deleted_files = self.get_deletedfiles(
             end=next(iter(self.skipped_listpage._revisions.values())).timestamp
         )
         # already_deleted_files = self.get_deletedfiles(total=10)
         self.skipped_listpage.clear_cache()
-        self.listpage_code = mwparserfromhell.parse(self.skipped_listpage.text)
-        table2 = get_seitenbot2_table2(self.listpage_code)
-        i = 1
-        remove_line_indexs = []
-        self.ignore_files = set()
-        table2_lines = table2.splitlines()
-        for i in range(len(table2_lines)):
-            match = re.match(r"\| *{{P\|ファイル\|([^}]+?)}}", table2_lines[i])
-            if not match:
+        self.skip_list = SkipList(self.skipped_listpage.text)
+        for file in already_deleted_files:
+            self.skip_list.remove(file.title(with_ns=False))
+
+    def _shard_suffix(self, shard=None):
+        shard = shard or self.shard
+        return ".{}of{}".format(*shard) if shard else ""
+
+    def _in_shard(self, page):
+        """タイトルのハッシュ値から、ページがこのシャードの担当かを判定する"""
+        if self.shard is None:
+            return True
+        digest = hashlib.sha1(page.title().encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") % self.shard[1] == self.shard[0] - 1
+
+    def _journal_file(self, shard=None):
+        return pywikibot.config.datafilepath(
+            "sd_file_journal{}.jsonl".format(self._shard_suffix(shard))
+        )
+
+    def _open_journal(self):
+        """処理結果の記録を開く。-resumeでは前回の結果を引き継ぐ
+
+        -mergeshardsでは各シャードの記録を読み込む
+        """
+        try:
+            self.journal = RunJournal(
+                self._journal_file(),
+                resume=self.opt.resume,
+                discard=self.opt.discardjournal,
+            )
+        except FileExistsError:
+            raise pywikibot.Error(
+                "前回の実行の記録が残っています。"
+                "-resumeで引き継ぐか、-discardjournalで破棄してください"
+            ) from None
+        outcomes = self.journal.outcomes()
+        self.shard_journals = []
+        for index in range(1, self.merge_shards + 1):
+            filename = self._journal_file((index, self.merge_shards))
+            shard_outcomes = read_outcomes(filename)
+            if shard_outcomes is None:
+                pywikibot.warning(
+                    "シャード{}/{}の記録がありません".format(index, self.merge_shards)
+                )
+                continue
+            self.shard_journals.append(filename)
+            outcomes.update(shard_outcomes)
+        self.handled = set()
+        for title, entry in outcomes.items():
+            self.handled.add(title)
+            if entry["outcome"] != "skipped":
                 continue
-            file = pywikibot.FilePage(
-                source=self.site, title=match.group(1), ignore_extension=True
+            page = pywikibot.FilePage(self.site, title, ignore_extension=True)
+            self.skipped[page][0] = set(entry["reasons"])
+            if entry["commons_title"]:
+                self.skipped[page][1] = pywikibot.FilePage(
+                    self.commons_site, entry["commons_title"], ignore_extension=True
+                )
+        if self.handled:
+            pywikibot.output(
+                "前回の実行で処理した{}件のファイルを省略します".format(
+                    len(self.handled)
+                )
             )
-            if file in already_deleted_files:
-                remove_line_indexs.append(i)
-            else:
-                self.ignore_files.add(file)
-        remove_line_indexs.reverse()
-        for index in remove_line_indexs:
-            table2_lines.pop(index)
-        self.listpage_code.replace(table2, "\n".join(table2_lines), recursive=False)
+
+    def get_missingfiles(self, titles):
+        """指定したファイルのうち、存在しないもののファイル名を返す"""
+        pagedicts = query_titles(
+            self.site, {"File:" + title: title for title in titles}
+        )
+        return {
+            title[len("File:") :]
+            for title, pagedict in pagedicts.items()
+            if "missing" in pagedict
+        }
 
     def get_deletedfiles(self, end=None, total=None):
         legen = self.site._generator(
@@ -167,29 +393,154 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
             if logentry["pageid"] == 0
         }
 
-    def init_page(self, item):
-        self.description = ""
-        return pywikibot.FilePage(source=item, ignore_extension=True)
+    def _category_members(self):
+        """カテゴリのファイルを、カテゴリに追加された日時の順に返す
 
-    def skip_page(self, page):
-        if int(page.namespace()) != 6:
-            return True
-        if not self.ignorelist and page in self.ignore_files:
-            return True
-        return super().skip_page(page)
+        -recentでは前回の実行で処理を終えたファイル以降に追加されたファイルのみを返す
+        同じ日時に追加されたファイルを落とさないよう、その日時から列挙し直す
+        """
+        params = {
+            "cmtitle": "Category:" + target_category,
+            "cmprop": "ids|title|timestamp",
+            "cmsort": "timestamp",
+            "cmnamespace": 6,
+            "cmdir": "asc",
+        }
+        if self.opt.recent:
+            if cursor := self._load_cursor():
+                params["cmstart"] = cursor.isoformat()
+            else:
+                params["cmdir"] = "desc"
+        total = int(self.opt.limit) if self.opt.limit else None
+        for item in self.site._generator(
+            api.ListGenerator, "categorymembers", **params
+        ):
+            page = pywikibot.FilePage(self.site, item["title"], ignore_extension=True)
+            # スキップリストに載っているファイルは数えずに除く
+            if not self._is_target(page):
+                continue
+            self.added_timestamps[page.title()] = pywikibot.Timestamp.fromISOformat(
+                item["timestamp"]
+            )
+            yield page
+            if total is not None:
+                total -= 1
+                if total <= 0:
+                    return
 
-    def treat_page(self):
+    def _load_cursor(self):
+        try:
+            with open(self.cursor_file, encoding="utf-8") as f:
+                cursor = json.load(f).get(target_category)
+        except (OSError, ValueError):
+            return None
+        return pywikibot.Timestamp.fromISOformat(cursor) if cursor else None
 
-        for category in self.current_page.categories():
-            if category.title(with_ns=False) in self.except_categories:
-                self._skip_delete("InvalidCategory")
+    def _advance_cursor(self, page):
+        """処理を終えたファイルがカテゴリに追加された日時まで、開始位置を進める"""
+        timestamp = self.added_timestamps.pop(page.title(), None)
+        if timestamp is not None and (self.cursor is None or self.cursor < timestamp):
+            self.cursor = timestamp
+
+    def _save_cursor(self):
         try:
-            self.current_page.text = self.current_page.get().replace("\u200e", "")
-        except Error as e:
-            pywikibot.error(str(e))
-            return
-        commons_file_name = self.current_page.title(with_ns=False)
-        wikicode = mwparserfromhell.parse(self.current_page.text)
+            with open(self.cursor_file, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data[target_category] = self.cursor.isoformat()
+        # 途中で止まっても壊れないよう、一時ファイルに書いてから置き換える
+        tmpname = "{}.{}.tmp".format(self.cursor_file, os.getpid())
+        with open(tmpname, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmpname, self.cursor_file)
+
+    def _prefetch(self, generator):
+        """次のファイルをまとめて読み込み、コモンズのファイルの存在・リダイレクト・ファイル履歴を一括で取得する"""
+        it = iter(generator)
+        while batch := list(itertools.islice(it, self.prefetch_size)):
+            pages = [
+                pywikibot.FilePage(source=item, ignore_extension=True) for item in batch
+            ]
+            targets = [page for page in pages if self._is_target(page)]
+            commons_pages = {}
+            for page in self.site.preloadpages(targets, groupsize=self.prefetch_size):
+                try:
+                    text = page.get().replace("\u200e", "")
+                    commons_page = pywikibot.FilePage(
+                        self.commons_site,
+                        title=self._get_commons_file_name(page, text),
+                        ignore_extension=True,
+                    )
+                except (Error, ValueError):
+                    continue
+                commons_pages.setdefault(commons_page.title(), commons_page)
+            load_pages(
+                self.commons_site,
+                commons_pages.values(),
+                ["info", "imageinfo"],
+                groupsize=self.prefetch_size,
+                follow_redirects=True,
+                iiprop=["sha1", "timestamp"],
+                iilimit="max",
+            )
+            # 全ての版を取得しているため、検証では取得し直さない
+            self.history.preload(commons_pages.values())
+            self.commons_pages.update(commons_pages)
+            yield from pages
+
+    def _lookahead(self, generator):
+        """後続のファイルの検証を別スレッドで先に進める
+
+        削除やテンプレートの貼り付けは、従来どおりメインスレッドで生成順に行う
+        """
+        pending = deque()
+        executor = self.lookahead_executor = ThreadPoolExecutor(
+            max_workers=self.lookahead
+        )
+        try:
+            for item in generator:
+                page = pywikibot.FilePage(source=item, ignore_extension=True)
+                if self._is_target(page):
+                    self.verified[page] = executor.submit(self._verify_ahead, page)
+                pending.append(page)
+                if len(pending) > self.lookahead:
+                    yield pending.popleft()
+            yield from pending
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _verify_ahead(self, page):
+        """別スレッドで検証を行い、結果を持ったボットの複製を返す"""
+        worker = copy.copy(self)
+        worker._current_page = page
+        worker.description = ""
+        worker.commons_page = None
+        worker.import_log_timestamp = None
+        worker.skipped = defaultdict(lambda: [set(), None])
+        worker.verified_ok = worker._verify()
+        return worker
+
+    def _take_over(self, worker):
+        """別スレッドでの検証結果を引き継ぐ"""
+        self.commons_page = worker.commons_page
+        self.import_log_timestamp = worker.import_log_timestamp
+        self.description = worker.description
+        if self.current_page in worker.skipped:
+            self.skipped[self.current_page] = worker.skipped[self.current_page]
+        return worker.verified_ok
+
+    def _is_target(self, page):
+        if int(page.namespace()) != 6:
+            return False
+        if page.title() in self.handled or not self._in_shard(page):
+            return False
+        return self.ignorelist or page.title(with_ns=False) not in self.skip_list
+
+    def _get_commons_file_name(self, page, text):
+        """即時削除テンプレートで指定されたコモンズのファイル名を取得する"""
+        commons_file_name = page.title(with_ns=False)
+        wikicode = mwparserfromhell.parse(text)
         for template in wikicode.filter_templates():
             template.name = re.sub(r"[ _]+", " ", str(template.name))
             if template.name.matches(self.sdtemplates):
@@ -202,7 +553,7 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
                     except ValueError:
                         pass
             elif template.name.matches(self.sdtemplates_f):
-                commons_file_name = self.current_page.title(with_ns=False)
+                commons_file_name = page.title(with_ns=False)
                 try:
                     v = str(template.get(1).value.strip_code())
                     if v:
@@ -210,21 +561,46 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
                         break
                 except ValueError:
                     pass
-        self.commons_page = pywikibot.FilePage(
-            self.commons_site, title=commons_file_name, ignore_extension=True
-        )
-        pywikibot.output(
-            "テンプレートで指定されたコモンズのファイル名: ", newline=False
-        )
-        pywikibot.output(self.commons_page.title(with_ns=False))
-        self._check()
+        return commons_file_name
+
+    def init_page(self, item):
+        self.description = ""
+        if isinstance(item, pywikibot.FilePage):
+            return item
+        return pywikibot.FilePage(source=item, ignore_extension=True)
+
+    def skip_page(self, page):
+        if self._is_target(page) and not super().skip_page(page):
+            return False
+        # 先に検証を始めていれば、その結果は使わない
+        if future := self.verified.pop(page, None):
+            future.cancel()
+        return True
+
+    def treat_page(self):
+
+        try:
+            self._treat_page()
+            self._advance_cursor(self.current_page)
+        finally:
+            self.history.discard(self.current_page, getattr(self, "commons_page", None))
+
+    def _treat_page(self):
+        if future := self.verified.pop(self.current_page, None):
+            if not self._take_over(future.result()):
+                return
+        elif not self._verify():
+            return
         if self.current_page in self.skipped:
             pywikibot.output("\n".join(self.skipped[self.current_page][0]))
             if (
                 "NotUsedFileImporter" in self.skipped[self.current_page][0]
                 and "OtherIssue" not in self.skipped[self.current_page][0]
             ):
-                self._put_template()
+                with self._stage("put_template"):
+                    self._put_template()
+            self.metrics.count("skipped")
+            self._record(self.current_page)
             return
         pywikibot.output(
             "「{}」を削除します".format(self.current_page.title(with_ns=True))
@@ -232,41 +608,230 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
         reason = "Bot: [[WP:CSD#ファイル1-5]] [[c:{}]]へ移行".format(
             self.commons_page.title(with_ns=True)
         )
-        time.sleep(1)
-        self.current_page.delete(
-            reason=reason, prompt=not self.opt.always, automatic_quit=True
-        )
+        if self.delete_queue is not None:
+            # 削除は別スレッドで行い、次のファイルの検証に進む
+            self.delete_queue.put((self.current_page, self.commons_page, reason))
+            return
+        with self._stage("delete"), self.site.throttle.paced_as("delete"):
+            deleted = self.current_page.delete(
+                reason=reason, prompt=not self.opt.always, automatic_quit=True
+            )
+        if deleted == 1:
+            self.metrics.count("deleted")
+            self.journal.record(self.current_page.title(), "deleted")
 
-    def _check(self):
+    def _delete_worker(self):
+        """削除キューのファイルを、削除のレート制限に従って順に削除する"""
+        while (item := self.delete_queue.get()) is not None:
+            page, commons_page, reason = item
+            try:
+                with self.metrics.stage("delete", page.title()):
+                    with self.site.throttle.paced_as("delete"):
+                        deleted = page.delete(reason=reason, prompt=False)
+                if deleted != 1:
+                    raise Error("削除されませんでした")
+            except Exception as e:
+                # 例外でスレッドが止まると、残りのファイルが削除も記録もされなくなる
+                pywikibot.error("{}: {}".format(page.title(), e))
+                self.delete_failures.append((page, commons_page))
+                self.journal.record(
+                    page.title(), "skipped", {"OtherIssue"}, commons_page.title()
+                )
+            else:
+                self.metrics.count("deleted")
+                self.journal.record(page.title(), "deleted")
+            finally:
+                self.delete_queue.task_done()
 
-        # インポートログ取得するために元のページを保存する
-        importlog_target = self.commons_page
+    def _finish_deletions(self):
+        """削除キューが空になるまで待ち、削除に失敗したファイルを見送ったものとする
+
+        途中で止まった場合は、キューに残ったファイルを削除せずに見送ったものとする
+        """
+        if self.delete_queue is None:
+            return
+        try:
+            if self.generator_completed:
+                self.delete_queue.join()
+        except KeyboardInterrupt:
+            pywikibot.warning("削除を中止します")
+        self._drain_deletions()
+        self.delete_queue.put(None)
+        self.delete_thread.join()
+        for page, commons_page in self.delete_failures:
+            self.skipped[page][0].add("OtherIssue")
+            self.skipped[page][1] = commons_page
 
-        # 即時削除テンプレートで指定されたコモンズのファイルが存在しなければ、移動ログから追跡する
+    def _drain_deletions(self):
+        """削除キューに残ったファイルを、削除せずに取り出して記録する"""
+        drained = 0
         while True:
-            if self.commons_page.exists():
+            try:
+                page, commons_page, _ = self.delete_queue.get_nowait()
+            except queue.Empty:
                 break
+            self.delete_failures.append((page, commons_page))
+            self.journal.record(
+                page.title(), "skipped", {"OtherIssue"}, commons_page.title()
+            )
+            self.delete_queue.task_done()
+            drained += 1
+        if drained:
+            pywikibot.warning(
+                "削除していない{}件のファイルを見送ったものとします".format(drained)
+            )
+
+    def _verify(self):
+        """ローカルとコモンズのファイルを読み込んで検証する。書き込みは行わない"""
+        with self._stage("verify"):
+            for category in self.current_page.categories():
+                if category.title(with_ns=False) in self.except_categories:
+                    self._skip_delete("InvalidCategory")
+            try:
+                self.current_page.text = self.current_page.get().replace("\u200e", "")
+            except Error as e:
+                pywikibot.error(str(e))
+                return False
+            commons_file_name = self._get_commons_file_name(
+                self.current_page, self.current_page.text
+            )
+            self.commons_page = pywikibot.FilePage(
+                self.commons_site, title=commons_file_name, ignore_extension=True
+            )
+            # 先読みで取得済みであれば、そのページを使う
+            self.commons_page = self.commons_pages.pop(
+                self.commons_page.title(), self.commons_page
+            )
+            pywikibot.output(
+                "テンプレートで指定されたコモンズのファイル名: ", newline=False
+            )
+            pywikibot.output(self.commons_page.title(with_ns=False))
+            self._check()
+            return True
+
+    def _resolve_commons_page(self):
+        """ローカルのファイルと同じハッシュ値のファイルをコモンズから探す
+
+        見つからなければ、テンプレートで指定されたファイルの移動ログを辿る
+        複数のファイルが見つかり、どれとも決められなければFalseを返す
+        """
+        try:
+            sha1 = self.current_page.latest_file_info.sha1
+        except (Error, ValueError):
+            sha1 = None
+        if sha1:
+            candidates = list(self.commons_site.allimages(sha1=sha1, total=50))
+            if len(candidates) == 1:
+                return candidates[0]
+            # ローカルのファイル名、テンプレートで指定されたファイル名の順に照合する
+            for page in (self.current_page, self.commons_page):
+                title = normalize_title(page.title(with_ns=False))
+                for candidate in candidates:
+                    if normalize_title(candidate.title(with_ns=False)) == title:
+                        return candidate
+            if candidates:
+                pywikibot.error(
+                    "同じハッシュ値のファイルが複数あります: {}".format(
+                        ", ".join(c.title(with_ns=False) for c in candidates)
+                    )
+                )
+                return False
+
+        page = self.commons_page
+        visited = {page.title()}
+        for _ in range(self.max_move_hops):
             try:
                 movelog = next(
                     iter(
-                        self.commons_site.logevents(
-                            logtype="move", page=self.commons_page, total=1
-                        )
+                        self.commons_site.logevents(logtype="move", page=page, total=1)
                     )
                 )
-                self.commons_page = pywikibot.FilePage(
-                    source=movelog.target_page(), ignore_extension=True
-                )
             except StopIteration:
+                return None
+            page = pywikibot.FilePage(
+                source=movelog.target_page(), ignore_extension=True
+            )
+            if page.exists():
+                return page
+            if page.title() in visited:
+                pywikibot.error("移動ログが循環しています")
+                return None
+            visited.add(page.title())
+        pywikibot.error(
+            "移動ログを{}回辿っても見つかりません".format(self.max_move_hops)
+        )
+        return None
+
+    def _check(self):
+
+        # インポートログ取得するために元のページを保存する
+        importlog_target = self.commons_page
+
+        # 即時削除テンプレートで指定されたコモンズのファイルが存在しなければ、移行先のファイルを探す
+        with self._stage("verify.commons_exists"):
+            exists = self.commons_page.exists()
+        if not exists:
+            with self._stage("verify.move_log"):
+                commons_page = self._resolve_commons_page()
+            if commons_page is False:
+                # 移行先を決められないため、手動での確認に回す
+                self._skip_delete("OtherIssue")
+                return
+            if commons_page is None:
                 self._skip_delete("CommonsFileNotExists")
                 return
+            self.commons_page = commons_page
 
         # コモンズのファイルがリダイレクトであれば、リダイレクトを辿る
         if self.commons_page.isRedirectPage():
             self.commons_page = self.commons_page.getRedirectTarget()
 
-        time.sleep(1)
+        cache_key = (
+            self.current_page.latest_revision_id,
+            self.commons_page.latest_revision_id,
+        )
+        if self.check_cache is not None and (
+            cached := self.check_cache.get(self.current_page.title(), *cache_key)
+        ):
+            # ローカルとコモンズのファイルが前回の確認から変わっていなければ、その結果を使う
+            pywikibot.output("前回の確認結果を使います")
+            self.metrics.count("cache_hits")
+            for reason in cached["reasons"]:
+                self._skip_delete(reason)
+            self.import_log_timestamp = cached["import_timestamp"]
+            self.description = cached["description"]
+            if cached["usage"]:
+                with self._stage("verify.usage"):
+                    self._check_usage()
+            return
 
+        with self._stage("verify.import_log"):
+            usage = self._check_import(importlog_target)
+        if usage:
+            with self._stage("verify.usage"):
+                self._check_usage()
+            with self._stage("verify.revision_walk"):
+                self._check_history()
+
+        if self.check_cache is not None:
+            reasons = (
+                self.skipped[self.current_page][0]
+                if self.current_page in self.skipped
+                else set()
+            )
+            self.check_cache.put(
+                self.current_page.title(),
+                *cache_key,
+                commons_title=self.commons_page.title(),
+                # ファイルの使用状況やカテゴリは版が変わらなくても変わりうるため保存しない
+                reasons=reasons - {"InvalidCategory", "UsedOldFileName"},
+                usage=usage,
+                import_timestamp=self.import_log_timestamp,
+                description=self.description,
+            )
+
+    def _check_import(self, importlog_target):
+        """インポート元と移入日時を確認する"""
         # コモンズからインポートログを取得する
         importlogs = tuple(
             self.commons_site.logevents(
@@ -285,15 +850,13 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
                         "指定されたコモンズのファイルのインポート元: ", newline=False
                     )
                     pywikibot.output(importfrom)
-                    return
+                    return False
                 self.import_log_timestamp = importlog.timestamp()
             else:
                 self._skip_delete("OtherIssue")
                 pywikibot.error("ログのフォーマットが異常です")
-                return
+                return False
         else:
-            time.sleep(1)
-
             # インポートログがなければ編集履歴を新しい順に走査し、インポート時に自動記入される要約欄を探す
             for revision in iter(
                 self.commons_page.revisions(reverse=False, content=False)
@@ -310,7 +873,7 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
                             newline=False,
                         )
                         pywikibot.output(importfrom)
-                        return
+                        return False
                 elif m := re.search(
                     r"moved page \[\[(File:.+?)\]\] to \[\[(File:.+?)\]\]",
                     revision.comment,
@@ -318,7 +881,9 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
                     importlog_target = m.group(1)
             else:
                 self._skip_delete("NotUsedFileImporter")
+        return True
 
+    def _check_usage(self):
         # ローカルのファイルを削除しても読み込みのリンク切れが生じないか確認
         if self.current_page.title(with_ns=False) != self.commons_page.title(
             with_ns=False
@@ -332,16 +897,11 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
             else:
                 self._skip_delete("UsedOldFileName")
 
-        time.sleep(1)
-
+    def _check_history(self):
         # FileImporterが使われていない場合に、ファイルのハッシュ値から移入日時を取得する
         if not self.import_log_timestamp:
             original_sha1 = self.current_page.latest_file_info.sha1
-            self.commons_page.get_file_history()
-            commons_file_histories = self.commons_page.get_file_history()
-            for info in (
-                commons_file_histories[k] for k in sorted(commons_file_histories.keys())
-            ):
+            for info in self.history.file_history(self.commons_page):
                 if info.sha1 == original_sha1:
                     self.import_log_timestamp = info.timestamp
                     break
@@ -350,17 +910,27 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
                 self._skip_delete("OtherIssue")
                 return
 
-        # ローカルのファイルの編集履歴を古いに走査し、本文も取得する
-        # 編集差分を生成するため、1つ前の版の本文はprevtextに保存する
-        prevtext = ""
-        for revision in self.current_page.revisions(reverse=True, content=True):
-            curtext = revision.text.replace("\u200e", "")
+        # ローカルのファイルの編集履歴を古い順に走査する
+        # 本文は確認が必要な版についてのみ、版の情報を取得した後にまとめて取得する
+        revisions = self.history.revisions(self.current_page)
+        texts = self._load_revision_texts(revisions)
+
+        # 編集差分を生成するため、1つ前の版のハッシュ値はprevsha1に保存する
+        # 同じハッシュ値の版は本文も同じであるため、確認を省略する
+        prevsha1 = None
+        checked_sha1 = set()
+        for revision in revisions:
+            curtext = texts.get(revision.sha1, "")
             if revision.timestamp < self.import_log_timestamp:
                 # コモンズの移入日時より前であれば、コモンズへの移行に関するお願いのようなものが本文にないか確認する
 
                 # 本文をself.descriptionに保存する
                 # {{Moved from Japanese Wikipedia}}の生成において、移入時点での本文を利用するため
                 self.description = curtext
+                if revision.sha1 in checked_sha1:
+                    prevsha1 = revision.sha1
+                    continue
+                checked_sha1.add(revision.sha1)
                 curcode = mwparserfromhell.parse(curtext)
                 for template in curcode.ifilter_templates():
                     template.name = re.sub(r"[ _]+", " ", str(template.name))
@@ -373,9 +943,12 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
                         self._remove_minor_codes(curtext),
                     ):
                         self._skip_delete("NoticeOfExportation")
-            elif revision.user not in ("MGA73", "MGA73bot"):
+            elif revision.user not in self.ignored_users:
                 # コモンズの移入日時より後であれば、明らかにコモンズへ反映させる必要のない編集のみであるかを確認する
                 # ただし特定の利用者による編集は無視する
+                if revision.sha1 == prevsha1:
+                    continue
+                prevtext = texts.get(prevsha1, "")
                 pywikibot.output("{0.timestamp} {0.user}".format(revision))
                 pywikibot.showDiff(prevtext, curtext)
 
@@ -385,7 +958,35 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
                 if normalized_prevtext == normalized_curtext:
                     continue
                 self._skip_delete("ChangedAfterExported")
-            prevtext = curtext
+            prevsha1 = revision.sha1
+
+    def _load_revision_texts(self, revisions):
+        """確認が必要な版の本文をまとめて取得し、ハッシュ値をキーとする辞書で返す
+
+        移入日時より前の版と、移入日時より後の無視しない利用者による版およびその直前の版が対象となる
+        """
+        needed = set()
+        prevsha1 = None
+        for revision in revisions:
+            if revision.timestamp < self.import_log_timestamp:
+                needed.add(revision.sha1)
+            elif revision.user not in self.ignored_users:
+                needed.update((revision.sha1, prevsha1))
+            prevsha1 = revision.sha1
+        revids = {}
+        for revision in revisions:
+            if revision.sha1 in needed:
+                revids.setdefault(revision.sha1, revision.revid)
+        revids = list(revids.values())
+        for i in range(0, len(revids), 50):
+            self.site.loadrevisions(
+                self.current_page, content=True, revids=revids[i : i + 50]
+            )
+        texts = {}
+        for revid in revids:
+            revision = self.current_page._revisions[revid]
+            texts[revision.sha1] = (revision.text or "").replace("\u200e", "")
+        return texts
 
     # 未使用
     # def _check_line(self, line):
@@ -400,29 +1001,19 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
 
     def _remove_minor_codes(self, text):
         """カテゴリや特定のテンプレートといった、コモンズへ反映させる必要のないものを除去する"""
-        code = mwparserfromhell.parse(text.strip())
-        for node in code.ifilter(recursive=False):
-            if isinstance(node, Wikilink) and node.title.lower().startswith(
-                ("category:", "カテゴリ:")
-            ):
-                code.remove(node)
-            elif isinstance(node, Template):
-                node.name = re.sub(r" +", " ", str(node.name))
-                if node.name.matches(
-                    self.sdtemplates
-                    | self.sdtemplates_f
-                    | self.nowcommons_templates
-                    | {
-                        "コモンズへの移動推奨",
-                        "GFDL",
-                        "GFDL-ja",
-                        "Self",
-                        "Copy to Wikimedia Commons",
-                        "MTC",
-                    }
-                ):
-                    code.remove(node)
-        return re.sub(r"\W+", "", str(code))
+        with self._stage("verify.remove_minor_codes"):
+            return self.minor_code_remover(text)
+
+    def _record(self, page):
+        """見送ったファイルの結果を記録する"""
+        reasons, commons_page = self.skipped[page]
+        self.journal.record(
+            page.title(), "skipped", reasons, commons_page and commons_page.title()
+        )
+
+    def _stage(self, name):
+        """現在のファイルについて、段階の所要時間とAPIの呼び出し回数を計測する"""
+        return self.metrics.stage(name, self.current_page.title())
 
     def _skip_delete(self, reason):
         self.skipped[self.current_page][0].add(reason)
@@ -469,9 +1060,8 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
         )
 
     def _make_template(self):
-        file_histories = self.current_page.get_file_history()
-        infos = [file_histories[k] for k in sorted(file_histories.keys())]
-        revisions = tuple(self.current_page.revisions(reverse=True))
+        infos = self.history.file_history(self.current_page)
+        revisions = self.history.revisions(self.current_page)
         if len(infos) > 9:
             raise pywikibot.Error("元のファイルの版数が多すぎます")
         if len(revisions) > 19:
@@ -539,8 +1129,90 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
         output.append("}}\n| other_information = \n}}\n")
         return "\n".join(output)
 
+    def _render_row(self, page, value, oldest_revids):
+        """見送ったファイルの一覧表の行を返す"""
+        row = io.StringIO()
+        row.write("| {{P|ファイル|")
+        row.write(page.title(with_ns=False))
+        row.write("}} ")
+        if value[1]:
+            if value[1].exists():
+                row.write("| [[:c:")
+                row.write(value[1].title(with_ns=True))
+                row.write("|最新版]] ")
+                oldest_revid = str(oldest_revids[value[1].title()])
+                row.write("/ [[:c:Special:PermaLink/")
+                row.write(oldest_revid)
+                row.write("|初版]] / [[:c:Special:Diff/")
+                row.write(oldest_revid)
+                row.write("/cur|差分]] / {{Fullurl|n=c%3A")
+                row.write(value[1].title(with_ns=True, as_url=True))
+                row.write("|p=action=history|s=履歴|t=コモンズの履歴}} ")
+            else:
+                row.write("| {{Fullurl|n=c%3ASpecial%3ALog|p=page=")
+                row.write(value[1].title(with_ns=True, as_url=True))
+                row.write("|s=ログ|t=コモンズの記録}} ")
+            row.write(
+                "| Yes "
+                if page.title(with_ns=False) == value[1].title(with_ns=False)
+                else "| '''No''' "
+            )
+        else:
+            row.write("| | ")
+        row.write("| ")
+        reasons = sorted([self.skipped_reason[r] for r in value[0]])
+        row.write(", ".join("[[#{0}|{0}]]".format(x) for x in reasons))
+        return row.getvalue()
+
+    def _load_commons_rows(self):
+        """一覧に載せるコモンズのファイルについて、存在の有無と初版の版番号をまとめて取得する
+
+        初版の取得は複数のページをまとめて問い合わせられないため、存在するページのみ並行して取得する
+        """
+        pages = {}
+        for value in self.skipped.values():
+            if value[1]:
+                # 同じファイルの行は、同じページオブジェクトを使う
+                value[1] = pages.setdefault(value[1].title(), value[1])
+        load_pages(
+            self.commons_site,
+            [page for page in pages.values() if not hasattr(page, "_pageid")],
+            ("info",),
+        )
+        existing = [page for page in pages.values() if page.exists()]
+        with ThreadPoolExecutor(max_workers=self.teardown_workers) as executor:
+            revids = executor.map(lambda page: page.oldest_revision.revid, existing)
+            return {
+                page.title(): revid
+                for page, revid in zip(existing, revids, strict=True)
+            }
+
     def teardown(self):
+        if self.lookahead_executor is not None:
+            # 検証中のスレッドがキャッシュを使い終えるまで待つ
+            self.lookahead_executor.shutdown(wait=True, cancel_futures=True)
+        self._finish_deletions()
+        # 先読みしただけのファイルを飛ばさないよう、最後まで処理した場合のみ保存する
+        if self.opt.recent and self.cursor is not None and self.generator_completed:
+            self._save_cursor()
+        if self.check_cache is not None:
+            self.check_cache.close()
+        try:
+            self.metrics.write()
+        except OSError as e:
+            pywikibot.warning("計測結果を書き出せませんでした: {}".format(e))
         if self.ignorelist:
+            # 一覧を更新しないため、最後まで処理した場合のみ記録を消す
+            self.journal.close(remove=self.generator_completed)
+            return
+        if self.shard:
+            # 一覧は-mergeshardsでまとめて更新する
+            self.journal.close()
+            pywikibot.output(
+                "全てのシャードが終わったら-mergeshards:{}で一覧を更新してください".format(
+                    self.shard[1]
+                )
+            )
             return
         # if len(self.skipped) == 0:
         # pywikibot.output('スキップリストを更新する必要はありません')
@@ -548,54 +1220,27 @@ class FileSdBot(SingleSiteBot, CurrentPageBot):
         # if 'sd_file_development.py' in __file__:
         # pywikibot.output('スキップリストへの書き込み操作は省略します')
         # return
-        newtable2 = io.StringIO()
-        # newtable2 = io.StringIO('{{Table2\n| class= wikitable sortable\n| cols = 4\n| number = 1\n')
-        # newtable2.write('| th1=ローカルのファイル |th2=コモンズのファイル |th3=コモンズと同名か |th4=見送った理由')
-        # newtable2.write('| cell1-2 = min-width: 13.5em;')
-        table2 = get_seitenbot2_table2(self.listpage_code)
-        newtable2.write(str(table2)[: table2.rindex("}}")])
+        oldest_revids = self._load_commons_rows()
         for page, value in self.skipped.items():
-            newtable2.write("| {{P|ファイル|")
-            newtable2.write(page.title(with_ns=False))
-            newtable2.write("}} ")
-            if value[1]:
-                if value[1].exists():
-                    newtable2.write("| [[:c:")
-                    newtable2.write(value[1].title(with_ns=True))
-                    newtable2.write("|最新版]] ")
-                    oldest_revid = str(value[1].oldest_revision.revid)
-                    newtable2.write("/ [[:c:Special:PermaLink/")
-                    newtable2.write(oldest_revid)
-                    newtable2.write("|初版]] / [[:c:Special:Diff/")
-                    newtable2.write(oldest_revid)
-                    newtable2.write("/cur|差分]] / {{Fullurl|n=c%3A")
-                    newtable2.write(value[1].title(with_ns=True, as_url=True))
-                    newtable2.write("|p=action=history|s=履歴|t=コモンズの履歴}} ")
-                else:
-                    newtable2.write("| {{Fullurl|n=c%3ASpecial%3ALog|p=page=")
-                    newtable2.write(value[1].title(with_ns=True, as_url=True))
-                    newtable2.write("|s=ログ|t=コモンズの記録}} ")
-                newtable2.write(
-                    "| Yes "
-                    if page.title(with_ns=False) == value[1].title(with_ns=False)
-                    else "| '''No''' "
-                )
-            else:
-                newtable2.write("| | ")
-            newtable2.write("| ")
-            reasons = sorted([self.skipped_reason[r] for r in value[0]])
-            newtable2.write(", ".join("[[#{0}|{0}]]".format(x) for x in reasons))
-            newtable2.write("\n")
-        newtable2.write("}}")
-        self.listpage_code.replace(table2, newtable2.getvalue(), recursive=False)
-        self.userPut(
+            self.skip_list.set(
+                page.title(with_ns=False), self._render_row(page, value, oldest_revids)
+            )
+        newtext = self.skip_list.text()
+        unchanged = self.skipped_listpage.text.rstrip() == newtext.rstrip()
+        saved = self.userPut(
             self.skipped_listpage,
             self.skipped_listpage.text,
-            str(self.listpage_code),
+            newtext,
             summary="Botによる: 一覧の更新",
             minor=False,
             show_diff=not self.opt.always,
         )
+        # 一覧に反映されるか、反映するものがなければ、記録は不要になる
+        done = bool(saved) or unchanged
+        self.journal.close(remove=done)
+        if done:
+            for filename in self.shard_journals:
+                os.remove(filename)
 
 
 def main(*args):
@@ -609,30 +1254,23 @@ def main(*args):
     for arg in local_args:
         arg, _, value = arg.partition(":")
         option = arg.partition("-")[2]
-        if option in ("always", "ignorelist", "recent"):
+        if option in (
+            "always",
+            "ignorelist",
+            "recent",
+            "nocache",
+            "deletequeue",
+            "resume",
+            "discardjournal",
+            "deletionlog",
+        ):
             options[option] = True
         else:
             options[option] = value
     generator = generator_factory.getCombinedGenerator()
     if not generator:
-        generator = PetScanPageGenerator(
-            [
-                "コモンズへの移動により即時削除対象となったファイル",
-            ],
-            namespaces=[
-                6,
-            ],
-            extra_options={
-                "output_limit": generator_factory.limit,
-                "outlinks_no": None
-                if options.get("ignorelist", False)
-                else skip_listpage,
-                "sortby": "date",
-                "sortorder": "descending"
-                if options.get("recent", False)
-                else "ascending",
-            },
-        )
+        # FileSdBotがカテゴリのファイルを列挙する
+        options["limit"] = generator_factory.limit
 
     FileSdBot(generator=generator, site=site, **options).run()
 
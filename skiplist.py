@@ -0,0 +1,122 @@
+# SeitenBot2 skiplist.py
+
+# MIT License
+#
+# Copyright (c) 2025 Honjitsu-Seiten (https://github.com/Honjitsu-Seiten)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import re
+
+import pywikibot
+import mwparserfromhell
+from mwparserfromhell.wikicode import Wikicode
+
+# 一覧表の行の先頭にあるローカルのファイル名
+row_pattern = re.compile(r"\| *{{P\|ファイル\|([^}]+?)}}")
+
+
+def get_seitenbot2_table2(wikicode: Wikicode):
+    result = wikicode.filter_templates(
+        matches=lambda x: (
+            x.name.matches("Table2")
+            and "seitenbot2" in str(x.get("class").value).split()
+        )
+    )
+    if not result:
+        pywikibot.error("一覧表が見つかりません")
+        raise ValueError("一覧表が見つかりません")
+    return result[0]
+
+
+def normalize_title(title):
+    """ファイル名を比較用に正規化する"""
+    title = re.sub(r"[ _]+", " ", title).strip()
+    return title[:1].upper() + title[1:]
+
+
+class SkipList:
+    """即時削除を見送ったファイルの一覧表
+
+    行は正規化したファイル名で引き、変更しなかった行は元の文字列のまま書き出す
+    """
+
+    def __init__(self, text):
+        code = mwparserfromhell.parse(text)
+        table = get_seitenbot2_table2(code)
+        index = code.index(table)
+        self.before = "".join(str(node) for node in code.nodes[:index])
+        self.after = "".join(str(node) for node in code.nodes[index + 1 :])
+        body = str(table)
+        end = body.rindex("}}")
+        self.footer = body[end:]
+        # 元の一覧表の末尾に改行がなければ、書き出すときも付けない
+        self.trailing = "\n" if body[:end].endswith("\n") else ""
+        # 除去した行はNoneとし、ファイル名から行番号を引く
+        self.rows = []
+        self.index = {}
+        for line in body[:end].splitlines():
+            if match := row_pattern.match(line):
+                self.index.setdefault(normalize_title(match.group(1)), []).append(
+                    len(self.rows)
+                )
+            self.rows.append(line)
+        if duplicates := [title for title, rows in self.index.items() if len(rows) > 1]:
+            pywikibot.warning(
+                "一覧に同じファイルの行が複数あります: {}".format(", ".join(duplicates))
+            )
+
+    def __contains__(self, title):
+        return normalize_title(title) in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def titles(self):
+        return list(self.index)
+
+    def remove(self, title):
+        """ファイルの行を全て除去し、除去したかどうかを返す"""
+        rows = self.index.pop(normalize_title(title), [])
+        for i in rows:
+            self.rows[i] = None
+        return bool(rows)
+
+    def set(self, title, row):
+        """行を追加または置き換える
+
+        同じファイルの行が複数あれば、最初の行を置き換えて残りを除去する
+        """
+        title = normalize_title(title)
+        if rows := self.index.get(title):
+            self.rows[rows[0]] = row
+            for i in rows[1:]:
+                self.rows[i] = None
+            if len(rows) > 1:
+                pywikibot.warning("一覧の{}の行を1つにまとめます".format(title))
+            self.index[title] = rows[:1]
+        else:
+            self.index[title] = [len(self.rows)]
+            self.rows.append(row)
+
+    def text(self):
+        """一覧表を置き換えたページの本文を返す"""
+        lines = "\n".join(line for line in self.rows if line is not None)
+        return self.before + lines + self.trailing + self.footer + self.after
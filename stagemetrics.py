@@ -0,0 +1,206 @@
+# SeitenBot2 stagemetrics.py
+
+# MIT License
+#
+# Copyright (c) 2025 Honjitsu-Seiten (https://github.com/Honjitsu-Seiten)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from pywikibot.comms import http
+
+# ヒストグラムの区切り（秒）
+buckets = (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120)
+
+_local = threading.local()
+_installed = False
+_install_lock = threading.Lock()
+
+
+def api_calls():
+    """現在のスレッドでのHTTPリクエストの回数を返す"""
+    return getattr(_local, "calls", 0)
+
+
+def install_counter():
+    """pywikibotのHTTPセッションに、スレッドごとのリクエストの計数を組み込む"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        request = http.session.request
+
+        def counted_request(*args, **kwargs):
+            _local.calls = api_calls() + 1
+            return request(*args, **kwargs)
+
+        http.session.request = counted_request
+        _installed = True
+
+
+class StageMetrics:
+    """ファイルごと・段階ごとの所要時間とAPIの呼び出し回数を集計する
+
+    段階の名前は「verify.import_log」のように、「.」で内訳を表す
+    """
+
+    def __init__(self, prefix, top=10):
+        self.prefix = prefix
+        self.top = top
+        self.lock = threading.Lock()
+        self.started = time.time()
+        # {ファイル名: {段階: [所要時間, 呼び出し回数, 回数]}}
+        self.files = defaultdict(lambda: defaultdict(lambda: [0.0, 0, 0]))
+        self.counters = defaultdict(int)
+        install_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name, title):
+        calls = api_calls()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                record = self.files[title][name]
+                record[0] += elapsed
+                record[1] += api_calls() - calls
+                record[2] += 1
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def _stages(self):
+        """段階ごとに、ファイル単位の所要時間と呼び出し回数をまとめる"""
+        stages = defaultdict(lambda: {"durations": [], "api_calls": 0})
+        for records in self.files.values():
+            for name, (elapsed, calls, _) in records.items():
+                stages[name]["durations"].append(elapsed)
+                stages[name]["api_calls"] += calls
+        return stages
+
+    def summary(self):
+        stages = {}
+        for name, stage in sorted(self._stages().items()):
+            durations = sorted(stage["durations"])
+            stages[name] = {
+                "files": len(durations),
+                "seconds": sum(durations),
+                "mean": sum(durations) / len(durations),
+                "median": durations[len(durations) // 2],
+                "max": durations[-1],
+                "api_calls": stage["api_calls"],
+            }
+        # 「.」を含む段階は内訳であるため、ファイルごとの合計には含めない
+        totals = {
+            title: sum(r[0] for n, r in records.items() if "." not in n)
+            for title, records in self.files.items()
+        }
+        slowest = sorted(totals, key=totals.get, reverse=True)[: self.top]
+        return {
+            "started": self.started,
+            "elapsed": time.time() - self.started,
+            "files": len(self.files),
+            "counters": dict(self.counters),
+            "stages": stages,
+            "slowest": [
+                {
+                    "title": title,
+                    "seconds": totals[title],
+                    "stages": {
+                        name: {"seconds": r[0], "api_calls": r[1]}
+                        for name, r in self.files[title].items()
+                    },
+                }
+                for title in slowest
+            ],
+        }
+
+    def prometheus(self):
+        lines = [
+            "# HELP sd_file_stage_seconds Time spent per file in each stage.",
+            "# TYPE sd_file_stage_seconds histogram",
+        ]
+        stages = self._stages()
+        for name, stage in sorted(stages.items()):
+            durations = stage["durations"]
+            for bound in buckets:
+                lines.append(
+                    'sd_file_stage_seconds_bucket{{stage="{}",le="{}"}} {}'.format(
+                        name, bound, sum(d <= bound for d in durations)
+                    )
+                )
+            lines.append(
+                'sd_file_stage_seconds_bucket{{stage="{}",le="+Inf"}} {}'.format(
+                    name, len(durations)
+                )
+            )
+            lines.append(
+                'sd_file_stage_seconds_sum{{stage="{}"}} {}'.format(
+                    name, sum(durations)
+                )
+            )
+            lines.append(
+                'sd_file_stage_seconds_count{{stage="{}"}} {}'.format(
+                    name, len(durations)
+                )
+            )
+        lines.append("# HELP sd_file_stage_api_calls API requests made in each stage.")
+        lines.append("# TYPE sd_file_stage_api_calls gauge")
+        for name, stage in sorted(stages.items()):
+            lines.append(
+                'sd_file_stage_api_calls{{stage="{}"}} {}'.format(
+                    name, stage["api_calls"]
+                )
+            )
+        lines.append("# HELP sd_file_events Number of events during the run.")
+        lines.append("# TYPE sd_file_events gauge")
+        for name, value in sorted(self.counters.items()):
+            lines.append('sd_file_events{{event="{}"}} {}'.format(name, value))
+        lines.append("# TYPE sd_file_files gauge")
+        lines.append("sd_file_files {}".format(len(self.files)))
+        lines.append("# TYPE sd_file_run_seconds gauge")
+        lines.append("sd_file_run_seconds {}".format(time.time() - self.started))
+        lines.append("# TYPE sd_file_last_run_timestamp_seconds gauge")
+        lines.append("sd_file_last_run_timestamp_seconds {}".format(time.time()))
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """Prometheusのtextfileと、JSONの要約を書き出す"""
+        with self.lock:
+            outputs = {
+                self.prefix + ".prom": self.prometheus(),
+                self.prefix + ".json": json.dumps(
+                    self.summary(), ensure_ascii=False, indent=2
+                ),
+            }
+        for filename, content in outputs.items():
+            # 収集中に読まれても壊れないよう、書き出してから置き換える
+            with open(filename + ".tmp", "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(filename + ".tmp", filename)
@@ -0,0 +1,124 @@
+# SeitenBot2 templatealias.py
+
+# MIT License
+#
+# Copyright (c) 2025 Honjitsu-Seiten (https://github.com/Honjitsu-Seiten)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import json
+import os
+import re
+import time
+
+import pywikibot
+
+from batchquery import query_titles
+
+# キャッシュの有効期間（秒）
+default_ttl = 24 * 60 * 60
+
+
+def normalize_template_name(name):
+    """テンプレート名を比較用に正規化する"""
+    name = re.sub(r"[\s_]+", " ", name).strip()
+    return name[:1].upper() + name[1:]
+
+
+def resolve_redirects(site, templates, groupsize=50):
+    """テンプレートへのリダイレクトをまとめて取得し、テンプレートごとの集合で返す"""
+    result = {template: set() for template in templates}
+    titles = {"Template:" + template: template for template in templates}
+    for title, pagedict in query_titles(
+        site,
+        titles,
+        groupsize,
+        prop="redirects",
+        rdnamespace=10,
+        rdprop="title",
+        rdlimit="max",
+    ).items():
+        for redirect in pagedict.get("redirects", []):
+            result[titles[title]].add(redirect["title"].partition(":")[2])
+    return result
+
+
+class TemplateAliasIndex:
+    """テンプレートとそのリダイレクトの対応を保持する
+
+    取得した結果はファイルに保存し、有効期間内であれば再利用する
+    """
+
+    def __init__(self, site, templates, filename=None, ttl=default_ttl):
+        self.site = site
+        self.filename = filename or pywikibot.config.datafilepath(
+            "template_aliases.json"
+        )
+        self.ttl = ttl
+        self.redirects = {}
+        stale = []
+        entries = self._load().get(str(site), {})
+        now = time.time()
+        for template in templates:
+            entry = entries.get(template)
+            if entry and now - entry["timestamp"] < ttl:
+                self.redirects[template] = set(entry["redirects"])
+            else:
+                stale.append(template)
+        if stale:
+            self.redirects.update(resolve_redirects(site, stale))
+            for template in stale:
+                entries[template] = {
+                    "timestamp": now,
+                    "redirects": sorted(self.redirects[template]),
+                }
+            self._save(entries)
+        # 正規化したテンプレート名から、元のテンプレート名を引く
+        self.canonical = {}
+        for template, redirects in self.redirects.items():
+            for alias in redirects | {template}:
+                self.canonical.setdefault(normalize_template_name(alias), template)
+
+    def _load(self):
+        try:
+            with open(self.filename, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, entries):
+        data = self._load()
+        data[str(self.site)] = entries
+        # 並行して動く他のプロセスと一時ファイルが重ならないようにする
+        tmpname = "{}.{}.tmp".format(self.filename, os.getpid())
+        try:
+            with open(tmpname, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmpname, self.filename)
+        except OSError as e:
+            pywikibot.warning("テンプレートの別名を保存できませんでした: {}".format(e))
+
+    def aliases(self, template):
+        """テンプレート自身とそのリダイレクトの集合を返す"""
+        return self.redirects[template] | {template}
+
+    def lookup(self, name):
+        """テンプレート名を正規化して照合し、元のテンプレート名を返す"""
+        return self.canonical.get(normalize_template_name(name))